@@ -0,0 +1,256 @@
+#analytics.py
+
+############ IMPORTS ############
+
+from events import GameState, iter_events, player_key
+from completion import PrefixIndex
+import asyncio, datetime, json, os
+
+########## CONSTANTS ##########
+
+PHASES = ('headstart', 'gametime', 'endtime')
+PLAYER_COLUMNS = ('games', 'wins', 'catches', 'runner_games', 'runner_seconds')
+LOCATION_COLUMNS = ('games', 'runner_wins')
+
+########## FUNCTIONS ##########
+
+def summarize_game(path:str):
+	"""Reads one archived event log and returns what the aggregates need from it, with players keyed by member id.
+	Blocks on disk, so runs in an executor"""
+
+	state = GameState()
+	runner_since = {} # Player -> when they became a runner
+	survival = {} # Player -> seconds spent as a runner
+
+	def stop_running(key:str, when:datetime.datetime):
+		if key in runner_since: survival[key] = survival.get(key, 0) + (when - runner_since.pop(key)).total_seconds()
+
+	for event in iter_events(path):
+		state.apply(event)
+		kind, when = event['type'], datetime.datetime.fromisoformat(event['time'])
+
+		if kind == 'start':
+			for key in state.runners: runner_since[key] = when
+
+		elif kind == 'join': runner_since[player_key(event, 'player')] = when
+
+		elif kind == 'catch': stop_running(player_key(event, 'runner'), when)
+
+		elif kind in ('resign', 'disqualify', 'win', 'switch'): stop_running(player_key(event, 'player'), when)
+
+		elif kind == 'end':
+			for key in list(runner_since): stop_running(key, when)
+
+	winners = set(state.winners) # Runners who reached the end, and the hunters still playing if they caught everyone
+	if state.outcome == 'HUNTERS WIN': winners |= state.hunters
+
+	return {
+		'players' : sorted(state.names), 'names' : state.names, 'winners' : sorted(winners), 'catches' : state.catches, 'survival' : survival,
+		'location' : state.location, 'runners_won' : state.outcome == 'HUNTERS LOSE', 'times' : state.times,
+	}
+
+def format_duration(seconds:float):
+	minutes, seconds = divmod(int(seconds), 60)
+	return f"{minutes}m {seconds:02d}s"
+
+########## CLASSES ##########
+
+class Analytics:
+	"""Aggregate statistics over every archived game, kept up to date by ingesting only games added to the manifest since
+	the last update
+
+	The aggregates are columnar : each player and location has a row number, and every statistic is a list indexed by
+	it, so they stay small and are saved to (and loaded from) one JSON file rather than re-reading the archive. Players
+	are keyed by member id, so someone who changes their display name keeps their statistics, and two people sharing a
+	name don't share them
+	"""
+
+	def __init__(self, archive, path:str = "logs/stats.json"):
+
+		self.archive = archive
+		self.path = path
+
+		self.offset = 0 # Bytes of the manifest already ingested
+		self.games = 0
+		self.outcomes = {}
+		self.phase_minutes = [0, 0, 0] # Totals of each phase's final length, after any extends or shortens
+
+		self.player_rows = {} # Member id (or name, for games archived before ids were logged) -> row
+		self.player_names = {} # Member id -> latest display name, for showing and finding players
+		self.players = {column : [] for column in PLAYER_COLUMNS}
+		self.location_rows = {}
+		self.locations = {column : [] for column in LOCATION_COLUMNS}
+		self.completions = PrefixIndex() # Player names -> member ids, for autocomplete
+
+		self._lock = asyncio.Lock()
+
+		if os.path.exists(path): self.load()
+
+	def load(self):
+
+		with open(self.path, "r") as stats_file:
+			state = json.load(stats_file)
+
+		self.offset, self.games, self.outcomes, self.phase_minutes = state['offset'], state['games'], state['outcomes'], state['phase_minutes']
+		self.players, self.locations = state['players'], state['locations']
+
+		keys = state.get('player_keys', state['player_names']) # Statistics saved before ids were logged are keyed by name
+		for row, (key, name) in enumerate(zip(keys, state['player_names'])):
+			self.player_rows[key] = row
+			self.rename(key, name)
+
+		self.location_rows = {name : row for row, name in enumerate(state['location_names'])}
+
+	def dump(self):
+
+		return json.dumps({
+			'offset' : self.offset, 'games' : self.games, 'outcomes' : self.outcomes, 'phase_minutes' : self.phase_minutes,
+			'player_keys' : list(self.player_rows), 'player_names' : [self.player_names[key] for key in self.player_rows], 'players' : self.players,
+			'location_names' : list(self.location_rows), 'locations' : self.locations,
+		})
+
+	def _save(self, content:str):
+
+		with open(self.path + ".tmp", "w") as stats_file:
+			stats_file.write(content)
+
+		os.replace(self.path + ".tmp", self.path)
+
+	def _row(self, rows:dict, columns:dict, name:str):
+
+		if name not in rows:
+			rows[name] = len(rows)
+			for column in columns.values(): column.append(0)
+
+		return rows[name]
+
+	def rename(self, key:str, name:str):
+		"""Records a player's latest display name, which is what they're shown and found by"""
+
+		if self.player_names.get(key) == name: return
+
+		self.player_names[key] = name
+		self.completions.remove(key)
+		self.completions.add(name, key)
+
+	def find(self, text:str):
+		"""Returns the key for a /stats player argument, which is a member id when picked from autocomplete, or a typed name"""
+
+		if text in self.player_rows: return text
+
+		text = text.lower().strip()
+		return next((key for key in self.completions.complete(text) if self.player_names[key].lower() == text), None)
+
+	def merge(self, game:dict, outcome:str):
+		"""Adds one game's summary to the aggregates"""
+
+		self.games += 1
+		self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+		for i, minutes in enumerate(game['times']): self.phase_minutes[i] += minutes
+
+		players = self.players
+		for key in game['players']:
+			row = self._row(self.player_rows, players, key)
+			self.rename(key, game['names'][key])
+
+			players['games'][row] += 1
+			if key in game['winners']: players['wins'][row] += 1
+
+		for key, catches in game['catches'].items():
+			players['catches'][self._row(self.player_rows, players, key)] += catches
+
+		for key, seconds in game['survival'].items():
+			row = self._row(self.player_rows, players, key)
+			players['runner_games'][row] += 1
+			players['runner_seconds'][row] += seconds
+
+		if game['location']:
+			row = self._row(self.location_rows, self.locations, game['location'])
+			self.locations['games'][row] += 1
+			if game['runners_won']: self.locations['runner_wins'][row] += 1
+
+	async def update(self):
+		"""Ingests every game archived since the last update, and returns how many there were"""
+
+		async with self._lock: # One update at a time, so no game is counted twice
+			loop = asyncio.get_running_loop()
+			entries, offset = await loop.run_in_executor(None, self.archive.read_manifest, self.offset)
+
+			for entry in entries:
+				try: game = await loop.run_in_executor(None, summarize_game, self.archive.path(entry, 'events'))
+				except (OSError, ValueError, KeyError) as e: print(f"Skipped archived game {entry['name']} : {e}")
+				else: self.merge(game, entry['outcome'])
+
+			if entries or offset != self.offset:
+				self.offset = offset
+				await loop.run_in_executor(None, self._save, self.dump())
+
+			return len(entries)
+
+	def player(self, key:str):
+		"""Returns a player's statistics, or None if they haven't played an archived game"""
+
+		row = self.player_rows.get(key)
+		if row is None: return None
+
+		stats = {column : values[row] for column, values in self.players.items()}
+		stats['win_rate'] = stats['wins'] / stats['games'] if stats['games'] else 0
+		stats['average_survival'] = stats['runner_seconds'] / stats['runner_games'] if stats['runner_games'] else 0
+
+		return stats
+
+	def top_players(self, column:str, count:int = 5, average_by:str = None):
+		"""Returns the `count` best (display name, value) pairs for a column, optionally divided by another column"""
+
+		names = [self.player_names[key] for key in self.player_rows]
+		values = self.players[column]
+
+		if average_by:
+			divisors = self.players[average_by]
+			values = [value / divisor if divisor else 0 for value, divisor in zip(values, divisors)]
+
+		best = sorted(range(len(names)), key = values.__getitem__, reverse = True)[:count]
+		return [(names[row], values[row]) for row in best if values[row]]
+
+	def location_win_rates(self, count:int = 5):
+		"""Returns the `count` locations where runners most often win, as (location, win rate, games)"""
+
+		games, wins = self.locations['games'], self.locations['runner_wins']
+		rates = [(name, wins[row] / games[row], games[row]) for name, row in self.location_rows.items()]
+
+		return sorted(rates, key = lambda rate : (rate[1], rate[2]), reverse = True)[:count]
+
+	def average_phases(self):
+		return [minutes / self.games for minutes in self.phase_minutes] if self.games else [0, 0, 0]
+
+	def summary(self):
+		"""A short human-readable overview of every archived game, for the /stats command"""
+
+		if not self.games: return "No games have been archived yet"
+
+		lines = [f"**{self.games}** games played : " + ", ".join(f"{count} {outcome}" for outcome, count in self.outcomes.items())]
+		lines.append("Average phase lengths : " + ", ".join(f"{phase} {minutes:.1f}m" for phase, minutes in zip(PHASES, self.average_phases())))
+
+		lines.append("\n**Most catches**")
+		lines.extend(f"{name} : {int(catches)}" for name, catches in self.top_players('catches'))
+
+		lines.append("\n**Longest average survival as a runner**")
+		lines.extend(f"{name} : {format_duration(seconds)}" for name, seconds in self.top_players('runner_seconds', average_by = 'runner_games'))
+
+		lines.append("\n**Best locations for runners**")
+		lines.extend(f"{location} : {rate:.0%} of {games} games" for location, rate, games in self.location_win_rates())
+
+		return "\n".join(lines)
+
+	def player_summary(self, text:str):
+
+		key = self.find(text)
+		stats = self.player(key) if key else None
+		if stats is None: return f"**{text}** has not played any archived games"
+
+		name = self.player_names[key]
+		return (
+			f"**{name}** has played **{stats['games']}** games and won **{stats['wins']}** ({stats['win_rate']:.0%})\n"
+			f"Catches : {stats['catches']}\n"
+			f"Average survival as a runner : {format_duration(stats['average_survival'])} over {stats['runner_games']} games"
+		)
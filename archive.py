@@ -0,0 +1,92 @@
+#archive.py
+
+############ IMPORTS ############
+
+import gzip, json, os, shutil, sys
+
+########## CONSTANTS ##########
+
+CHUNK_SIZE = 64 * 1024 # Bytes copied at a time, so a long log is never held in memory whole
+
+########## FUNCTIONS ##########
+
+def compress(source:str, destination:str):
+	"""Streams a file into a gzip archive"""
+
+	with open(source, "rb") as source_file, gzip.open(destination, "wb") as archive_file:
+		shutil.copyfileobj(source_file, archive_file, CHUNK_SIZE)
+
+########## CLASSES ##########
+
+class Archive:
+	"""The compressed logs of every finished game, with a manifest so past games can be listed without opening each one
+
+	Each game is stored as '<name>.txt.gz' (the human-readable log) and '<name>.jsonl.gz' (its events), and gets one
+	line in 'manifest.jsonl' with its start time, player count and outcome
+	"""
+
+	def __init__(self, folder:str = "logs"):
+
+		self.folder = folder
+		self.manifest_path = os.path.join(folder, "manifest.jsonl")
+		os.makedirs(folder, exist_ok = True)
+
+	def add(self, name:str, text_path:str, events_path:str, entry:dict):
+		"""Compresses a game's two log files into the archive and records it in the manifest. Returns the manifest entry
+
+		This blocks on disk, so the bot runs it in an executor
+		"""
+
+		base, copy = name, 1
+		while os.path.exists(os.path.join(self.folder, f"{name}.txt.gz")): # Two games started in the same second
+			copy += 1
+			name = f"{base}-{copy}"
+
+		entry = {'name' : name, 'text' : f"{name}.txt.gz", 'events' : f"{name}.jsonl.gz", **entry}
+
+		compress(text_path, os.path.join(self.folder, entry['text']))
+		compress(events_path, os.path.join(self.folder, entry['events']))
+
+		with open(self.manifest_path, "a") as manifest: # Written last, so the manifest never lists a missing archive
+			manifest.write(json.dumps(entry) + "\n")
+
+		return entry
+
+	def path(self, entry:dict, kind:str = 'text'):
+		"""Returns the path of a game's 'text' or 'events' archive"""
+
+		return os.path.join(self.folder, entry[kind])
+
+	def read_manifest(self, offset:int = 0):
+		"""Returns the entries added after byte `offset` of the manifest, and the offset to read from next time"""
+
+		if not os.path.exists(self.manifest_path): return [], 0
+
+		with open(self.manifest_path, "rb") as manifest:
+			manifest.seek(offset)
+			lines = manifest.read().splitlines(keepends = True)
+
+		entries = []
+		for line in lines:
+			if not line.endswith(b"\n"): break # Still being written
+			offset += len(line)
+			if line.strip(): entries.append(json.loads(line))
+
+		return entries, offset
+
+	def entries(self):
+		"""Streams the manifest entries, oldest first"""
+
+		if not os.path.exists(self.manifest_path): return
+
+		with open(self.manifest_path, "r") as manifest:
+			for line in manifest:
+				if line.strip(): yield json.loads(line)
+
+########## LISTING TOOL ##########
+
+if __name__ == '__main__':
+
+	# Usage: python archive.py [folder]
+	for entry in Archive(sys.argv[1] if len(sys.argv) > 1 else "logs").entries():
+		print(f"{entry['start_time']}  {entry['players']:>4} players  {entry['outcome']:<14} {entry['text']}")
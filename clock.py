@@ -0,0 +1,148 @@
+#clock.py
+
+############ IMPORTS ############
+
+import asyncio, datetime, heapq, itertools, time
+
+########## CLASSES ##########
+
+class Clock:
+	"""Real time. All of the game's timing goes through the shared `clock` below, so a simulation can swap in a VirtualClock"""
+
+	def monotonic(self):
+		return time.monotonic()
+
+	def time(self):
+		return time.time()
+
+	def now(self):
+		return datetime.datetime.fromtimestamp(self.time())
+
+	async def sleep(self, seconds:float):
+		await asyncio.sleep(seconds)
+
+	async def wait_event(self, event:asyncio.Event, timeout:float):
+		"""Waits up to `timeout` seconds for an event to be set, and returns whether it was
+
+		asyncio.wait_for on Python 3.11 swallows a cancellation that arrives just as the event is set, which leaves a
+		background task running after shutdown has cancelled it. asyncio.wait never does
+		"""
+
+		waiter = asyncio.ensure_future(event.wait())
+
+		try: await asyncio.wait((waiter,), timeout = timeout)
+		finally: waiter.cancel() # Only has an effect if it timed out or we were cancelled
+
+		return waiter.done() and not waiter.cancelled()
+
+class VirtualClock(Clock):
+	"""Time that only moves when advance() is called, which jumps straight to the next pending sleep or timeout
+
+	A whole game's worth of phases, timeouts and batching windows then runs as fast as the code itself does
+	"""
+
+	def __init__(self, start:float = None):
+
+		self.elapsed = 0.0
+		self.epoch = time.time() if start is None else start # Wall time at which the clock started
+		self.timers = [] # Heap of (deadline, order, future)
+		self.order = itertools.count()
+
+	def monotonic(self):
+		return self.elapsed
+
+	def time(self):
+		return self.epoch + self.elapsed
+
+	async def sleep(self, seconds:float):
+
+		if seconds <= 0:
+			await asyncio.sleep(0)
+			return
+
+		future = asyncio.get_running_loop().create_future()
+		heapq.heappush(self.timers, (self.elapsed + seconds, next(self.order), future))
+		await future
+
+	async def wait_event(self, event:asyncio.Event, timeout:float):
+
+		waiter = asyncio.ensure_future(event.wait())
+		timer = asyncio.ensure_future(self.sleep(timeout))
+
+		try: await asyncio.wait((waiter, timer), return_when = asyncio.FIRST_COMPLETED)
+
+		finally:
+			waiter.cancel()
+			timer.cancel()
+
+		return waiter.done() and not waiter.cancelled()
+
+	async def settle(self, rounds:int = 20):
+		"""Lets every task that can run without time passing do so"""
+
+		for _ in range(rounds): await asyncio.sleep(0)
+
+	async def advance(self):
+		"""Settles, then moves time forward to the next pending deadline and wakes everything due then
+
+		Returns the number of sleepers woken, which is 0 once nothing is waiting on the clock
+		"""
+
+		await self.settle()
+
+		while self.timers and self.timers[0][2].done(): heapq.heappop(self.timers) # Cancelled sleeps
+		if not self.timers: return 0
+
+		self.elapsed = max(self.elapsed, self.timers[0][0])
+		woken = 0
+
+		while self.timers and self.timers[0][0] <= self.elapsed:
+			_, _, future = heapq.heappop(self.timers)
+			if not future.done():
+				future.set_result(None)
+				woken += 1
+
+		return woken
+
+	async def run_until(self, condition, limit:float = None):
+		"""Advances time until `condition()` is true. Raises TimeoutError if it isn't by `limit` virtual seconds from now"""
+
+		deadline = None if limit is None else self.elapsed + limit
+		stalled = 0
+
+		while not condition():
+			if deadline is not None and self.elapsed > deadline: raise TimeoutError(f"Still waiting after {limit} virtual seconds")
+
+			if await self.advance(): stalled = 0
+			else: # Nothing is sleeping on the clock, so only work in other threads (such as log writes) can make progress
+				stalled += 1
+				if stalled > 5000: raise TimeoutError("Nothing is waiting on the clock, and the condition never became true")
+				await asyncio.sleep(0.001)
+
+class SharedClock(Clock):
+	"""The clock every module uses. It forwards to real time unless use() swaps in another clock"""
+
+	def __init__(self):
+		self.source = Clock()
+
+	def use(self, source:Clock):
+		self.source = source
+
+	def monotonic(self):
+		return self.source.monotonic()
+
+	def time(self):
+		return self.source.time()
+
+	def now(self):
+		return self.source.now()
+
+	async def sleep(self, seconds:float):
+		await self.source.sleep(seconds)
+
+	async def wait_event(self, event:asyncio.Event, timeout:float):
+		return await self.source.wait_event(event, timeout)
+
+########## CONSTANTS ##########
+
+clock = SharedClock()
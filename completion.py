@@ -0,0 +1,72 @@
+#completion.py
+
+############ IMPORTS ############
+
+import bisect
+
+########## CONSTANTS ##########
+
+MAX_CHOICES = 25 # The most choices Discord will show for an autocomplete
+
+########## FUNCTIONS ##########
+
+def word_keys(name:str):
+	"""Returns the lowercased name starting from each of its words, so 'Belmont Park' can be found by 'park'"""
+
+	lower = name.lower()
+	return {lower} | {lower[i + 1:] for i, char in enumerate(lower) if char == ' ' and lower[i + 1:]}
+
+########## CLASSES ##########
+
+class PrefixIndex:
+	"""A sorted index of names for autocomplete, matching a typed prefix against the start of any word in a name
+
+	Each name can stand for a different value (such as a member id), which is what complete() returns
+	"""
+
+	def __init__(self, names = ()):
+
+		self.keys = [] # Sorted (key, value) pairs
+		self.labels = {} # Value -> name
+
+		for name in names: self.add(name)
+
+	def __contains__(self, value):
+		return value in self.labels
+
+	def __len__(self):
+		return len(self.labels)
+
+	def label(self, value):
+		return self.labels.get(value)
+
+	def add(self, name:str, value = None):
+
+		value = name if value is None else value
+		if value in self.labels: return
+		self.labels[value] = name
+
+		for key in word_keys(name):
+			bisect.insort(self.keys, (key, value))
+
+	def remove(self, value):
+
+		name = self.labels.pop(value, None)
+		if name is None: return
+
+		for key in word_keys(name):
+			i = bisect.bisect_left(self.keys, (key, value))
+			if i < len(self.keys) and self.keys[i] == (key, value): del self.keys[i]
+
+	def complete(self, text:str, limit:int = MAX_CHOICES):
+		"""Returns up to `limit` values whose name has a word starting with `text`, in alphabetical order of the matched word"""
+
+		text = text.lower().strip()
+		results = {} # Used as an ordered set
+
+		for i in range(bisect.bisect_left(self.keys, (text,)), len(self.keys)):
+			key, value = self.keys[i]
+			if not key.startswith(text) or len(results) >= limit: break
+			results[value] = None
+
+		return list(results)
@@ -0,0 +1,233 @@
+#events.py
+
+############ IMPORTS ############
+
+from gamelog import LogWriter
+from clock import clock
+import gzip, json, sys
+
+########## CONSTANTS ##########
+
+EVENT_FIELDS = { # Every event also carries 'seq', 'time' and 'type'. Players are named for the log, with member ids for statistics
+	'start' : ('start_time', 'runners', 'hunters', 'runner_ids', 'hunter_ids', 'times', 'location'),
+	'catch' : ('hunter', 'runner', 'hunter_id', 'runner_id'),
+	'resign' : ('player', 'player_id'),
+	'disqualify' : ('admin', 'player', 'player_id', 'reason'),
+	'win' : ('player', 'player_id'),
+	'phase' : ('phase',),
+	'extend' : ('phase', 'minutes'),
+	'shorten' : ('phase', 'minutes'),
+	'location' : ('player', 'location'),
+	'comment' : ('player', 'note'),
+	'join' : ('player', 'player_id'),
+	'switch' : ('player', 'player_id'),
+	'arrive' : ('player', 'distance'),
+	'end' : ('outcome',),
+}
+
+PHASE_NAMES = {'headstart' : 'HEADSTART', 'gametime' : 'MAINGAME', 'endtime' : 'ENDTIME'}
+
+########## FUNCTIONS ##########
+
+def make_event(seq:int, kind:str, **fields):
+	"""Builds an event record, checking it against the schema"""
+
+	if kind not in EVENT_FIELDS: raise ValueError(f"Unknown event type {kind}")
+
+	missing = set(EVENT_FIELDS[kind]) - set(fields)
+	if missing: raise ValueError(f"{kind} event is missing {', '.join(sorted(missing))}")
+
+	return {'seq' : seq, 'time' : clock.now().isoformat(timespec = 'seconds'), 'type' : kind, **fields}
+
+def render(event:dict):
+	"""Renders an event as the human-readable lines of the classic game log"""
+
+	kind = event['type']
+
+	if kind == 'start':
+		text = f"\nSTART {event['start_time']}\n\nPLAYERS {len(event['runners']) + len(event['hunters'])}\n"
+		text += "".join(f"RUNNER {player}\n" for player in event['runners'])
+		text += "".join(f"HUNTER {player}\n" for player in event['hunters'])
+		text += f"\nTIMES {' '.join(str(time) for time in event['times'])}\nLOCATION {event['location']}\n-----  MAIN LOG  -----\n\n"
+		return text
+
+	if kind == 'catch': lines = [f"{event['hunter']} CATCH {event['runner']}", f"{event['runner']} -> HUNTER"]
+	elif kind == 'resign': lines = [f"RESIGN {event['player']}", f"{event['player']} -> LEAVES"]
+	elif kind == 'disqualify': lines = [f"{event['admin']} DISQUALIFIES {event['player']} REASON: {event['reason']}", f"{event['player']} -> LEAVES"]
+	elif kind == 'win': lines = [f"WIN {event['player']}", f"{event['player']} -> LEAVES"]
+	elif kind == 'phase': lines = [f"PHASE {PHASE_NAMES[event['phase']]} END"]
+	elif kind == 'extend': lines = [f"PHASE {event['phase'].upper()} ADD {event['minutes']}"]
+	elif kind == 'shorten': lines = [f"PHASE {event['phase'].upper()} SUBTRACT {event['minutes']}"]
+	elif kind == 'location': lines = [f"CHANGE-LOCATION {event['player']} {event['location']}"]
+	elif kind == 'comment': lines = [f"COMMENT {event['player']} {event['note']}"]
+	elif kind == 'join': lines = [f"LATE-PLAYER-ADD {event['player']}", f"{event['player']} -> RUNNER"]
+	elif kind == 'switch': lines = [f"PLAYER {event['player']} Runner -> Hunter"]
+	elif kind == 'arrive': lines = [f"ARRIVE {event['player']} {event['distance'] * 1000:.0f}M FROM END"]
+	elif kind == 'end': lines = [f"GAME ENDED - {event['outcome']}"]
+
+	time = event['time'][-8:] # HH:MM:SS
+	return "".join(f"{time} {line}\n" for line in lines)
+
+def player_key(event:dict, field:str):
+	"""Returns who an event's player field refers to : their member id, or their name in logs written before ids were
+	recorded. Ids are strings so they survive a round trip through JSON"""
+
+	member_id = event.get(field + '_id')
+	return event[field] if member_id is None else str(member_id)
+
+def iter_events(path:str):
+	"""Streams the events from a newline-delimited log one at a time. Archived '.gz' logs are decompressed as they are read"""
+
+	opener = gzip.open if path.endswith(".gz") else open
+
+	with opener(path, "rt") as events_file:
+		for line in events_file:
+			if line.strip(): yield json.loads(line)
+
+def replay(path:str, until:int = None):
+	"""Rebuilds the game state from an event log, stopping after sequence number `until` if given"""
+
+	state = GameState()
+
+	for event in iter_events(path):
+		if until is not None and event['seq'] > until: break
+		state.apply(event)
+
+	return state
+
+########## CLASSES ##########
+
+class GameState:
+	"""The state of a game as rebuilt from its events
+
+	Players are keyed by member id (as a string, as player_key() returns it), so someone who changes their nickname
+	mid-game is still the same player. `names` has the latest display name for each, which to_dict() shows them by
+	"""
+
+	def __init__(self):
+
+		self.seq = 0
+		self.start_time = None
+		self.times = []
+		self.location = None
+		self.names = {} # Player -> latest display name in the log
+		self.runners = set()
+		self.hunters = set()
+		self.left = set()
+		self.winners = set()
+		self.catches = {} # hunter -> number of catches
+		self.phases_ended = []
+		self.outcome = None
+
+	def player(self, event:dict, field:str):
+		"""Returns the player an event's field refers to, noting the name it was logged under"""
+
+		key = player_key(event, field)
+		self.names[key] = event[field]
+		return key
+
+	def apply(self, event:dict):
+		"""Updates the state with a single event"""
+
+		kind = event['type']
+		self.seq = event['seq']
+
+		if kind == 'start':
+			self.start_time = event['start_time']
+			self.times = list(event['times'])
+			self.location = event['location']
+
+			for team in ('runners', 'hunters'):
+				keys = [str(key) for key in event.get(team[:-1] + '_ids', event[team])]
+				self.names.update(zip(keys, event[team]))
+				setattr(self, team, set(keys))
+
+		elif kind == 'catch':
+			runner, hunter = self.player(event, 'runner'), self.player(event, 'hunter')
+			self.runners.discard(runner)
+			self.hunters.add(runner)
+			self.catches[hunter] = self.catches.get(hunter, 0) + 1
+
+		elif kind in ('resign', 'disqualify', 'win'):
+			player = self.player(event, 'player')
+			self.runners.discard(player)
+			self.hunters.discard(player)
+			self.left.add(player)
+			if kind == 'win': self.winners.add(player)
+
+		elif kind == 'phase': self.phases_ended.append(event['phase'])
+
+		elif kind in ('extend', 'shorten'):
+			index = ('headstart', 'gametime', 'endtime').index(event['phase'])
+			self.times[index] += event['minutes'] if kind == 'extend' else -event['minutes']
+
+		elif kind == 'location': self.location = event['location']
+
+		elif kind == 'join': self.runners.add(self.player(event, 'player'))
+
+		elif kind == 'switch':
+			player = self.player(event, 'player')
+			self.runners.discard(player)
+			self.hunters.add(player)
+
+		elif kind == 'end': self.outcome = event['outcome']
+
+	def to_dict(self):
+
+		named = lambda players : sorted(self.names[player] for player in players)
+
+		return {
+			'seq' : self.seq, 'start_time' : self.start_time, 'times' : self.times, 'location' : self.location,
+			'runners' : named(self.runners), 'hunters' : named(self.hunters), 'left' : named(self.left),
+			'winners' : named(self.winners), 'catches' : {self.names[hunter] : count for hunter, count in self.catches.items()},
+			'phases_ended' : self.phases_ended, 'outcome' : self.outcome,
+		}
+
+class EventLog:
+	"""Writes numbered events to a newline-delimited file, and their human-readable form to a text log"""
+
+	def __init__(self, events_path:str, text_path:str):
+
+		self.events = LogWriter(events_path)
+		self.text = LogWriter(text_path)
+		self.seq = 0
+
+	def reset(self):
+		"""Starts a fresh pair of log files for a new game"""
+
+		self.discard()
+		self.seq = 0
+
+		for path in (self.events.path, self.text.path):
+			open(path, "w").close()
+
+	def write(self, kind:str, **fields):
+		"""Records an event and returns it"""
+
+		self.seq += 1
+		event = make_event(self.seq, kind, **fields)
+
+		self.events.write(json.dumps(event) + "\n")
+		self.text.write(render(event))
+
+		return event
+
+	async def flush(self, fsync:bool = False):
+		await self.events.flush(fsync)
+		await self.text.flush(fsync)
+
+	def flush_now(self):
+		self.events.flush_now()
+		self.text.flush_now()
+
+	def discard(self):
+		self.events.discard()
+		self.text.discard()
+
+########## REPLAY TOOL ##########
+
+if __name__ == '__main__':
+
+	# Usage: python events.py logs/<name>.jsonl.gz [seq], or a running game's games/<guild id>/<channel id>/current.jsonl
+	until = int(sys.argv[2]) if len(sys.argv) > 2 else None
+	print(json.dumps(replay(sys.argv[1], until).to_dict(), indent = 4))
@@ -0,0 +1,212 @@
+#fakediscord.py
+
+############ IMPORTS ############
+
+import discord
+import asyncio, collections, contextvars, itertools, random
+
+########## CONSTANTS ##########
+
+ids = itertools.count(10 ** 17) # Snowflake-sized ids, so they look like the real thing
+current_command = contextvars.ContextVar('current_command', default = None) # Which command an API call is made on behalf of
+RATE_LIMITED_ROUTES = ('add_role', 'remove_role') # Routes that rate limiting is injected into, as they share one bucket per guild
+
+########## CLASSES ##########
+
+class FakeHTTPResponse:
+	"""What discord.HTTPException reads from a response"""
+
+	def __init__(self, status:int, reason:str):
+
+		self.status = status
+		self.reason = reason
+
+class ApiCounter:
+	"""Counts the simulated REST calls made against the fake guild, and adds a fixed latency to each one
+
+	With `rate_limit`, that fraction of role edits are refused with a 429 instead, half as the discord.RateLimited that
+	discord.py raises when the wait is too long, and half as the HTTPException it raises once its own retries run out
+	"""
+
+	def __init__(self, latency:float = 0.0, rate_limit:float = 0.0, seed:int = 0):
+
+		self.latency = latency
+		self.rate_limit = rate_limit
+		self.rng = random.Random(seed)
+		self.calls = collections.Counter() # Route -> calls
+		self.by_command = collections.Counter() # Command -> calls, including any tasks it spawned
+		self.rate_limited = collections.Counter() # Route -> calls refused with a 429
+
+	async def call(self, route:str):
+
+		self.calls[route] += 1
+		self.by_command[current_command.get()] += 1
+		if self.latency: await asyncio.sleep(self.latency)
+
+		if route in RATE_LIMITED_ROUTES and self.rng.random() < self.rate_limit:
+			self.rate_limited[route] += 1
+			if self.rng.random() < 0.5: raise discord.RateLimited(self.rng.uniform(0.1, 2.0))
+			raise discord.HTTPException(FakeHTTPResponse(429, "Too Many Requests"), {'message' : "You are being rate limited.", 'code' : 0})
+
+	def total(self):
+		return sum(self.calls.values())
+
+class FakeRole:
+
+	def __init__(self, name:str):
+
+		self.id = next(ids)
+		self.name = name
+
+class FakeUser:
+
+	def __init__(self, name:str):
+
+		self.id = next(ids)
+		self.name = name
+		self.display_name = name
+
+class FakeMember(FakeUser):
+
+	def __init__(self, guild, name:str):
+
+		super().__init__(name)
+		self.guild = guild
+		self.roles = []
+
+	def get_role(self, role_id:int):
+		return next((role for role in self.roles if role.id == role_id), None)
+
+	async def add_roles(self, *roles):
+
+		await self.guild.api.call("add_role")
+		self.roles.extend(role for role in roles if role not in self.roles)
+
+	async def remove_roles(self, *roles):
+
+		await self.guild.api.call("remove_role")
+		self.roles = [role for role in self.roles if role not in roles]
+
+class FakeMessage:
+
+	def __init__(self, channel, content:str):
+
+		self.id = next(ids)
+		self.channel = channel
+		self.content = content
+		self.reactions = []
+
+	async def add_reaction(self, emoji:str):
+		await self.channel.guild.api.call("add_reaction")
+
+class FakeChannel:
+
+	def __init__(self, guild, name:str):
+
+		self.id = next(ids)
+		self.guild = guild
+		self.name = name
+		self.mention = f"#{name}"
+		self.messages = {}
+
+	async def send(self, content:str = None, file = None):
+
+		await self.guild.api.call("send_message")
+		message = FakeMessage(self, content)
+		self.messages[message.id] = message
+		return message
+
+	async def fetch_message(self, message_id:int):
+
+		await self.guild.api.call("fetch_message")
+		return self.messages[int(message_id)]
+
+class FakeGuild:
+	"""A guild with `member_count` members, the Runner, Hunter and Admin roles (after `extra_roles` others, as in a big
+	server), and the three game channels
+	"""
+
+	def __init__(self, member_count:int, api:ApiCounter, extra_roles:int = 0):
+
+		self.id = next(ids)
+		self.api = api
+
+		self.roles = [FakeRole(f"role{i}") for i in range(extra_roles)] + [FakeRole('Runner'), FakeRole('Hunter'), FakeRole('Admin')]
+		self.role_index = {role.id : role for role in self.roles} # Like the real guild, which keeps its roles in a dict by id
+		self.members = [FakeMember(self, f"member{i}") for i in range(member_count)]
+
+		self.bot_channel = FakeChannel(self, "manhunt")
+		self.hunter_channel = FakeChannel(self, "hunters")
+		self.log_channel = FakeChannel(self, "logs")
+
+	def get_member(self, member_id:int):
+		return next((member for member in self.members if member.id == member_id), None)
+
+	def get_role(self, role_id:int):
+		return self.role_index.get(role_id)
+
+	def role(self, name:str):
+		return next(role for role in self.roles if role.name == name)
+
+class FakeResponse:
+	"""Like the real one, refuses to acknowledge an interaction twice"""
+
+	def __init__(self):
+
+		self.messages = []
+		self.acks = 0 # Deferrals and initial responses, which should only ever add up to 1
+		self.deferred = False
+
+	def is_done(self):
+		return bool(self.acks)
+
+	def _acknowledge(self):
+
+		if self.acks: raise RuntimeError("This interaction has already been responded to before")
+		self.acks += 1
+
+	async def defer(self, ephemeral:bool = False, thinking:bool = False):
+
+		self._acknowledge()
+		self.deferred = True
+
+	async def send_message(self, content:str = None, ephemeral:bool = False):
+
+		self._acknowledge()
+		self.messages.append(content)
+
+class FakeFollowup:
+
+	def __init__(self, response:FakeResponse):
+		self.response = response
+
+	async def send(self, content:str = None, ephemeral:bool = False):
+
+		if not self.response.acks: raise RuntimeError("Follow-ups need the interaction to be acknowledged first")
+		self.response.messages.append(content)
+
+class FakeInteraction:
+	"""Enough of a discord.Interaction for the command handlers: who used it, where, and a response to reply through"""
+
+	def __init__(self, user:FakeMember, channel:FakeChannel):
+
+		self.user = user
+		self.channel = channel
+		self.channel_id = channel.id
+		self.guild = channel.guild
+		self.guild_id = channel.guild.id
+		self.response = FakeResponse()
+		self.followup = FakeFollowup(self.response)
+		self.extras = {}
+
+class FakeReactionPayload:
+	"""Stands in for discord.RawReactionActionEvent"""
+
+	def __init__(self, message:FakeMessage, member:FakeMember, emoji:str):
+
+		self.message_id = message.id
+		self.channel_id = message.channel.id
+		self.guild_id = message.channel.guild.id
+		self.user_id = member.id
+		self.member = member
+		self.emoji = emoji
@@ -0,0 +1,559 @@
+#game_commands.py
+
+# The commands that suggest, start, play and end games. A command extension, so /reload can swap it in place
+
+############ IMPORTS ############
+
+import discord
+from discord import app_commands
+from runtime import lean, games, location_index, role_cache, metrics, responses
+from gameplay import get_game, pick_end_location, member_index, load_members, outbox, player_name, team_names, argument_name, resolve_player, reconcile_lobby, set_player_roles, archive_game, check_game_status
+from gameplay import location_autocomplete, runner_autocomplete, player_autocomplete
+from scheduler import PhaseScheduler
+from games import Game
+from responses import reply
+from permissions import DENIED_MESSAGE
+from outbox import HIGH, NORMAL
+from clock import clock
+import os, random, asyncio, math
+
+########## COMMANDS ##########
+
+@app_commands.command(name = "start-game", description = "Starts an active suggestion as a game of Manhunt")
+@app_commands.describe(headstart = "How long the runners' headstart is", gametime = "How long the main game period lasts", endtime = "How long runners have to reach the end location",
+	start = "Where the runners start from, to pick an end location a set distance away", min_distance = "The closest the end location can be to the start, in km", max_distance = "The furthest the end location can be from the start, in km")
+@app_commands.autocomplete(start = location_autocomplete)
+@metrics.timed
+@responses.deferred
+async def start_game(interaction: discord.Interaction, headstart: int = 5, gametime: int = 70, endtime: int = 15, start: str = None, min_distance: float = 0.0, max_distance: float = None):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	try:
+		async with game.lock: # The lobby may need fetching first, and nothing else should start or unsuggest the game meanwhile
+
+			if not game.suggestion_open: error = "There is not currently an active game suggestion, or there is a game in progress"
+
+			else:
+				if not game.lobby_synced: await reconcile_lobby(game) # Only needed if the bot restarted after the suggestion was made
+				await load_members(interaction.guild, [*game.lobby['runners'], *game.lobby['hunters']])
+
+				runners, hunters = game.lobby['runners'], game.lobby['hunters']
+
+				if len(runners) < 1 or len(hunters) < 1: error = "There must be at least 1 hunter and 1 runner in order to start a game"
+				elif runners.keys() & hunters.keys(): error = 'Someone appears to have reacted to both the runner and hunter roles. Please remove duplicate reactions'
+				elif headstart <= 0 or gametime <= 0 or endtime <= 0: error = 'All game times must be greater than 0. Try again with valid game times'
+				elif not location_index: error = "There are no end locations yet. Add some with /add-location or /import-locations before starting a game"
+				elif start and not location_index.coordinates(start): error = f"**{start}** is not a location with coordinates. Pick a start location that has them, or leave it out"
+
+				else: # Only picked once everything else checks out
+					end_location = pick_end_location(game, start, min_distance, max_distance or math.inf)
+					error = None if end_location else f"No end location is between {min_distance} and {max_distance} km from **{start}**. Try a wider distance range"
+
+				if not error: # This section here starts the game
+					members = member_index(interaction.guild)
+					for team in ('runners', 'hunters'): # Moves everyone from the lobby into the game, using their current names
+						for user_id, name in game.lobby[team].items():
+							member = members.get(user_id)
+							game.players.add(user_id, member.display_name if member else name, team)
+
+					game.game_running = True
+					game.start_time = clock.now()
+					game.scheduler = PhaseScheduler(headstart * 60, gametime * 60, endtime * 60)
+					game.end_location = end_location
+
+					game.log.reset() # Replaces the suggestion id with a fresh log, starting with all the 'metadata'
+					runner_names, hunter_names = team_names(game, interaction.guild, 'runners'), team_names(game, interaction.guild, 'hunters')
+					game.log.write('start', start_time = str(game.start_time), runners = runner_names, hunters = hunter_names, runner_ids = game.players.ids('runners'), hunter_ids = game.players.ids('hunters'), times = [headstart, gametime, endtime], location = game.end_location)
+
+					games.save(game)
+					game.phase_task = asyncio.create_task(check_game_status(game))
+
+	except discord.errors.NotFound: # The program cannot find the reaction message
+
+		await reply(interaction, f"Message with ID **{game.suggestion_id}** not found.")
+		outbox(game.bot_channel).post(f"**{interaction.user.display_name}** tried to start a game, but the reaction message was not found. Please unsuggest and create a new suggestion", priority = NORMAL)
+		return
+
+	except Exception as e: # Some other error occurred
+
+		await reply(interaction, f"You may want to create a new suggestion. The following error occured : **{e}**")
+		return
+
+	if error:
+		await reply(interaction, error)
+		return
+
+	roles = game.edit(None, set_player_roles(game, interaction.guild, add = True)) # Gives all runners and hunters their roles
+
+	outbox(game.hunter_channel).post(f"The end location is : **{game.end_location}**", priority = NORMAL)
+
+	message = f"The game was started by **{interaction.user.display_name}**.\n\nThe hunters are : {', '.join(hunter_names)}\n\nThe runners are : {', '.join(runner_names)}\n\nYou have **{headstart}** minutes headstart, **{gametime}** minutes of main game time, and **{endtime}** minutes to reach the end location, which is given to you at the start of the end phase"
+	message += "\n\nA reminder of the following things : \n1. Make sure your phone has sufficient charge\n2. Make sure to text your flat person\n3. Make sure you have appropriate clothing, for weather and road safety\n4. Make sure you can get back to accommodation before 10\n5. It is advisable to have accomodation keys on you"
+	message += "\n\nMake sure to turn your Glympse tracker on, and turn off Snapmap etc.\n\nHave fun!"
+
+	outbox(game.bot_channel).post(message, priority = NORMAL)
+
+	await roles
+	await reply(interaction, "Game successfully started")
+
+@app_commands.command(name = "lobby", description = "Lists everyone who has joined the current game suggestion")
+@metrics.timed
+@responses.deferred
+async def lobby(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.suggestion_open:
+
+		try:
+			if not game.lobby_synced: await reconcile_lobby(game)
+
+			message = ''
+			for name in game.lobby['runners'].values(): message += f"{name} - Runner\n"
+			for name in game.lobby['hunters'].values(): message += f"{name} - Hunter\n"
+
+			await reply(interaction, message[:2000] or "Nobody has joined the suggestion yet")
+
+		except discord.errors.NotFound: await reply(interaction, "The suggestion message was not found. Please unsuggest and create a new suggestion")
+
+	else: await reply(interaction, "There is not currently an active game suggestion")
+
+@app_commands.command(name = "suggest-game", description = "Creates a reaction message so people can join a proposed game")
+@metrics.timed
+@responses.deferred
+async def suggest_game(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	async with game.lock: # The suggestion only exists once its message has been sent, so two at once would both be sent
+
+		if os.path.exists(game.current_path):
+			await reply(interaction, 'There is already an open suggestion. Please delete this before attempting to suggest another game')
+			return
+
+		message = await game.bot_channel.send(f"A game of Manhunt has been suggested by **{interaction.user.display_name}**. React to this message with :bow_and_arrow: or :athletic_shoe: in order to join this game.")
+
+		message_id = str(message.id) + '\n'
+
+		with open(game.current_path, "w") as game_file:
+			game_file.write(message_id)
+
+		game.suggestion_id = message.id
+		game.lobby = {'hunters' : {}, 'runners' : {}}
+		game.lobby_synced = True
+		games.save(game)
+
+	await message.add_reaction(game.RUNNER_REACTION)
+	await message.add_reaction(game.HUNTER_REACTION)
+
+	await reply(interaction, 'A game of Manhunt has been suggested')
+
+@app_commands.command(name = "resign", description = "The player who runs this command leaves the game")
+@metrics.timed
+@responses.deferred
+async def resign(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+		player_name = interaction.user.display_name
+		team = game.players.team_of(interaction.user.id)
+
+		if team == 'runners':
+			game.players.remove(interaction.user.id, 'resigned') # Before anything is awaited, so a second /resign or a /catch sees they've left
+			game.scheduler.wake()
+			game.log.write('resign', player = player_name, player_id = interaction.user.id)
+			games.save(game)
+			outbox(game.bot_channel).post(f"{player_name} has resigned from the game")
+
+			runner_role = role_cache.get(interaction.guild, game.RUNNER_ROLE)
+			await game.edit(interaction.user.id, interaction.user.remove_roles(runner_role))
+			await reply(interaction, "You have successfully resigned as a runner")
+
+		elif team == 'hunters':
+			game.players.remove(interaction.user.id, 'resigned')
+			game.log.write('resign', player = player_name, player_id = interaction.user.id)
+			games.save(game)
+			hunter_role = role_cache.get(interaction.guild, game.HUNTER_ROLE)
+			role_removed = game.edit(interaction.user.id, interaction.user.remove_roles(hunter_role))
+
+			if game.players.count('hunters') == 0:
+				outbox(game.bot_channel).post(f"**{player_name}** has resigned from the game. There are now 0 hunters. Please pick a new hunter", priority = NORMAL)
+
+			else:
+				outbox(game.bot_channel).post(f"**{player_name}** has resigned from the game. There are now {game.players.count('hunters')} hunters")
+
+			await role_removed
+			await reply(interaction, "You have successfully resigned as a hunter")
+
+		else: await reply(interaction, "You are not currently a player in the game")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "add-player", description = "The Discord member who uses this command will get added to a current game as a runner")
+@metrics.timed
+@responses.deferred
+async def add_player(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		player_name = interaction.user.display_name
+
+		if game.players.team_of(interaction.user.id):
+			message = f"You are already in the game."
+
+		else:
+			game.players.add(interaction.user.id, player_name, 'runners')
+			if lean: member_index(interaction.guild).add(interaction.user)
+			game.log.write('join', player = player_name, player_id = interaction.user.id)
+			games.save(game)
+			message = f"You have been added to the game as a runner."
+
+			outbox(game.bot_channel).post(f"**{interaction.user.display_name}** has been added to the game as a runner.")
+
+			runner_role = role_cache.get(interaction.guild, game.RUNNER_ROLE)
+			await game.edit(interaction.user.id, interaction.user.add_roles(runner_role))
+
+		await reply(interaction, message)
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "add-hunter", description = "A runner who uses this command will become a hunter")
+@metrics.timed
+@responses.deferred
+async def add_hunter(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		if role_cache.has(interaction.user, game.RUNNER_ROLE) and game.players.team_of(interaction.user.id) == 'runners':
+
+			game.players.move(interaction.user.id, 'hunters')
+			game.log.write('switch', player = interaction.user.display_name, player_id = interaction.user.id)
+			games.save(game)
+			outbox(game.bot_channel).post(f"**{interaction.user.display_name}** has made themself a hunter")
+
+			runner_role, hunter_role = role_cache.get(interaction.guild, game.RUNNER_ROLE), role_cache.get(interaction.guild, game.HUNTER_ROLE)
+			await asyncio.gather(game.edit(interaction.user.id, interaction.user.remove_roles(runner_role)), game.edit(interaction.user.id, interaction.user.add_roles(hunter_role)))
+
+			await reply(interaction, f"You have been converted from a runner to a hunter")
+
+		else: await reply(interaction, DENIED_MESSAGE)
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "random-runner", description = "Picks a random runner")
+@metrics.timed
+@responses.deferred
+async def random_runner(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		try:
+			random_runner = player_name(game, interaction.guild, random.choice(game.players.ids('runners')))
+			outbox(game.bot_channel).post(f"**{interaction.user.display_name}** used the random-runner command, **{random_runner}** was selected")
+			await reply(interaction, f"The runner randomly selected is **{random_runner}**")
+
+		except IndexError: await reply(interaction, "An error occured. Please try again")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "catch", description = "The hunter who uses this command catches the given runner")
+@app_commands.describe(runner = "The runner caught by the hunter")
+@app_commands.autocomplete(runner = runner_autocomplete)
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.HUNTER_ROLE)
+async def catch(interaction: discord.Interaction, runner: str):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		runner_id = resolve_player(interaction.guild, runner)
+
+		if game.players.team_of(runner_id) == 'runners':
+
+			runner = player_name(game, interaction.guild, runner_id)
+			game.players.move(runner_id, 'hunters') # Before anything is awaited, so nobody else can catch them too
+			game.scheduler.wake()
+			game.log.write('catch', hunter = interaction.user.display_name, runner = runner, hunter_id = interaction.user.id, runner_id = runner_id)
+			games.save(game)
+
+			outbox(game.bot_channel).post(f"**{runner}** has been caught by **{interaction.user.display_name}**. They are now a hunter")
+
+			runner_role, hunter_role = role_cache.get(interaction.guild, game.RUNNER_ROLE), role_cache.get(interaction.guild, game.HUNTER_ROLE)
+			member = member_index(interaction.guild).get(runner_id)
+			if member: await asyncio.gather(game.edit(runner_id, member.remove_roles(runner_role)), game.edit(runner_id, member.add_roles(hunter_role)))
+
+			await reply(interaction, f"You caught **{runner}**")
+
+		else: await reply(interaction, f"**{argument_name(game, interaction.guild, runner, runner_id)}** is not a runner in the current game.")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "disqualify", description = "Disqualifies a player from the game")
+@app_commands.describe(player = "The player to be disqualified", reason = "Reason for disqualification")
+@app_commands.autocomplete(player = player_autocomplete)
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.ADMIN_ROLE)
+async def disqualify(interaction: discord.Interaction, player: str, reason: str):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		player_id = resolve_player(interaction.guild, player)
+		team = game.players.team_of(player_id)
+		member = member_index(interaction.guild).get(player_id)
+
+		if team: player = player_name(game, interaction.guild, player_id)
+
+		if team == 'runners':
+
+			game.players.remove(player_id, 'disqualified')
+			game.scheduler.wake()
+			game.log.write('disqualify', admin = interaction.user.display_name, player = player, player_id = player_id, reason = reason)
+			games.save(game)
+			outbox(game.bot_channel).post(f"**{player}** has been disqualified by **{interaction.user.display_name}**. Reason: **{reason}**")
+
+			runner_role = role_cache.get(interaction.guild, game.RUNNER_ROLE)
+			if member: await game.edit(player_id, member.remove_roles(runner_role))
+			await reply(interaction, f"**{player}** has been disqualified")
+
+		elif team == 'hunters':
+
+			game.players.remove(player_id, 'disqualified')
+			game.log.write('disqualify', admin = interaction.user.display_name, player = player, player_id = player_id, reason = reason)
+			games.save(game)
+			outbox(game.bot_channel).post(f"**{player}** has been disqualified by **{interaction.user.display_name}**. Reason: **{reason}**")
+
+			hunter_role = role_cache.get(interaction.guild, game.HUNTER_ROLE)
+			if member: await game.edit(player_id, member.remove_roles(hunter_role))
+			await reply(interaction, f"**{player}** has been disqualified")
+
+		else: await reply(interaction, f"**{argument_name(game, interaction.guild, player, player_id)}** is not currently a participant in the current game")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "comment", description = "Add an observation to the game log")
+@app_commands.describe(note = "The observation you want to record")
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.ADMIN_ROLE)
+async def comment(interaction: discord.Interaction, note:str):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		game.log.write('comment', player = interaction.user.display_name, note = note)
+		games.save(game)
+		await reply(interaction, "Your comment has been added to the game log")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "win", description = "The runner who uses this command has made it to the end location")
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.RUNNER_ROLE)
+async def win(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running and game.main_game_announced: # The end phase starts when the main game is over
+
+		winner = interaction.user.display_name
+		if game.players.team_of(interaction.user.id) == 'runners':
+
+			game.players.remove(interaction.user.id, 'won')
+			game.log.write('win', player = winner, player_id = interaction.user.id)
+
+			game.winner = True
+			games.save(game)
+			game.scheduler.wake()
+
+			outbox(game.bot_channel).post(f"**{winner}** has successfully reached the end location and is a winner")
+
+			runner_role = role_cache.get(interaction.guild, game.RUNNER_ROLE)
+			await game.edit(interaction.user.id, interaction.user.remove_roles(runner_role))
+			await reply(interaction, "Congratulations, you have won")
+
+		else: await reply(interaction, "You are not currently a runner in the game")
+
+	else: await reply(interaction, "There is not an active Manhunt game in the end phase")
+
+@app_commands.command(name = "extend", description = "Extends a given phase by a given number of minutes")
+@app_commands.describe(phase = "The phase to extend ('headstart', 'gametime', or 'endtime')", time = "The number of minutes to extend the phase")
+@metrics.timed
+@responses.deferred
+async def extend(interaction: discord.Interaction, phase: str, time: int):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		if phase in ['headstart', 'gametime', 'endtime']:
+
+			if game.scheduler.extend(phase, time * 60): # Reschedules the pending deadline, waking the phase task
+				game.log.write('extend', phase = phase, minutes = time)
+				games.save(game)
+				outbox(game.bot_channel).post(f"**{interaction.user.display_name}** has extended **{phase}** by **{time}** minutes")
+				await reply(interaction, f"{phase.capitalize()} extended by **{time}** minutes")
+
+			else: await reply(interaction, f"{phase.capitalize()} has already passed and cannot be extended")
+
+		else: await reply(interaction, "Invalid phase. Please choose 'headstart', 'gametime', or 'endtime'")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "shorten", description = "Removes a given number of minutes from a given phase")
+@app_commands.describe(phase = "The phase to shorten ('headstart', 'gametime', or 'endtime')", time = "The number of minutes to shorten the phase")
+@metrics.timed
+@responses.deferred
+async def shorten(interaction: discord.Interaction, phase: str, time: int):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		if phase in ['headstart', 'gametime', 'endtime']:
+
+			if game.scheduler.shorten(phase, time * 60):
+				game.log.write('shorten', phase = phase, minutes = time)
+				games.save(game)
+				outbox(game.bot_channel).post(f"**{interaction.user.display_name}** has shortened **{phase}** by **{time}** minutes")
+				await reply(interaction, f"{phase.capitalize()} shortened by **{time}** minutes")
+
+			else: await reply(interaction, f"{phase.capitalize()} has already passed, or the given time is not appropriate")
+
+		else: await reply(interaction, "Invalid phase. Please choose 'headstart', 'gametime', or 'endtime'")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "set-location", description = "Changes the end location of a Manhunt game")
+@app_commands.describe(location = "The new location for the game's end")
+@app_commands.autocomplete(location = location_autocomplete)
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.HUNTER_ROLE)
+async def set_location(interaction: discord.Interaction, location: str):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		if not game.main_game_announced: # Before the end phase, when the runners are told where it is
+
+			if location in location_index:
+
+				game.log.write('location', player = interaction.user.display_name, location = location)
+				game.end_location = location
+				games.save(game)
+
+				outbox(game.hunter_channel).post(f"The end location has been changed to **{game.end_location}**", priority = NORMAL)
+				outbox(game.bot_channel).post(f"**{interaction.user.display_name}** has changed the end location")
+				await reply(interaction, f"The end location is now **{location}**")
+
+			else: await reply(interaction, f"Location **{location}** does not exist. Please use a valid end location")
+
+		else: await reply(interaction, "You can only change the location during the headstart or gametime phase")
+
+	else: await reply(interaction, "There is not an active Manhunt game")
+
+@app_commands.command(name = "end-game", description = "Ends the game unconditionally")
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.ADMIN_ROLE)
+async def end_game(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		game.game_running = False
+		game.ending = True
+		game.phase_task.cancel()
+
+		await game.settle() # Role changes already under way finish first, so none of them land after the roles are removed
+		await set_player_roles(game, interaction.guild, add = False)
+		await archive_game(game, 'NO WIN')
+
+		outbox(game.bot_channel).post(f"The current Manhunt game has been unconditionally ended by **{interaction.user.display_name}**", priority = HIGH)
+		await reply(interaction, "The game has been ended")
+
+	else: await reply(interaction, "There is no active Manhunt game")
+
+@app_commands.command(name="players-list", description = "Lists all the players in a running game")
+@metrics.timed
+@responses.deferred
+async def players_list(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	if game.game_running:
+
+		message = ''
+
+		for player in team_names(game, interaction.guild, 'runners'): message = message + player + ' - Runner\n'
+
+		for player in team_names(game, interaction.guild, 'hunters'):
+			message = message + player + ' - Hunter\n'
+
+	else: message = 'There is not currently an active game'
+
+	await reply(interaction, message)
+
+@app_commands.command(name="unsuggest", description = "Removes any outstanding game suggestions")
+@metrics.timed
+@responses.deferred
+async def unsuggest(interaction: discord.Interaction):
+
+	game = await get_game(interaction)
+	if game is None: return
+
+	async with game.lock: # Waits for any /start-game that is still fetching the lobby
+
+		removed = game.suggestion_open
+		if removed:
+			os.remove(game.current_path)
+			game.reset_vars()
+			games.save(game)
+
+	if removed:
+		outbox(game.bot_channel).post(f"The current Manhunt suggestion was removed by **{interaction.user.display_name}**", priority = NORMAL)
+		await reply(interaction, "The current suggestion was deleted")
+
+	else: await reply(interaction, 'There is not currently a Manhunt game suggestion')
+
+########## EXTENSION ##########
+
+COMMANDS = (start_game, lobby, suggest_game, resign, add_player, add_hunter, random_runner, catch, disqualify, comment, win, extend, shorten, set_location, end_game, players_list, unsuggest)
+
+async def setup(bot):
+	"""Adds this extension's commands to the tree. Unloading the extension takes them out again"""
+
+	for command in COMMANDS: bot.tree.add_command(command)
@@ -0,0 +1,104 @@
+#gamelog.py
+
+############ IMPORTS ############
+
+from clock import clock
+import asyncio, collections, os
+
+########## CLASSES ##########
+
+class LogWriter:
+	"""Queues log lines in memory and appends them to a file in batches from a background task"""
+
+	def __init__(self, path:str, interval:float = 1.0, max_batch:int = 50):
+
+		self.path = path
+		self.interval = interval
+		self.max_batch = max_batch
+
+		self.queue = collections.deque() # (enqueue time, line)
+		self.last_flush_latency = 0.0 # Seconds the oldest line in the last batch waited before reaching the file
+		self.max_flush_latency = 0.0
+
+		self._task = None
+		self._wakeup = None
+		self._flushing = asyncio.Lock() # One batch at a time, so batches reach the file in order and a flush waits for any already in progress
+
+	@property
+	def queue_depth(self):
+		return len(self.queue)
+
+	def write(self, line:str):
+		"""Queues a line to be appended to the file. The background task is started on first use"""
+
+		self.queue.append((clock.monotonic(), line))
+
+		if self._task is None:
+			self._wakeup = asyncio.Event()
+			self._task = asyncio.get_running_loop().create_task(self._run())
+
+		if len(self.queue) == 1 or len(self.queue) >= self.max_batch: self._wakeup.set()
+
+	async def _run(self):
+
+		while True:
+			await self._wakeup.wait() # Sleeps without a timer while there is nothing to write
+			self._wakeup.clear()
+
+			if len(self.queue) < self.max_batch: # Gives the batch up to `interval` to fill
+				await clock.wait_event(self._wakeup, self.interval)
+				self._wakeup.clear()
+
+			await self.flush()
+
+	def _take_batch(self):
+		"""Removes every queued line and returns them with the enqueue time of the oldest one"""
+
+		if not self.queue: return None, []
+
+		oldest = self.queue[0][0]
+		lines = [line for _, line in self.queue]
+		self.queue.clear()
+
+		return oldest, lines
+
+	def _append(self, lines:list, fsync:bool):
+
+		if not lines and not os.path.exists(self.path): return # Nothing to sync, and the file shouldn't be recreated
+
+		with open(self.path, "a") as log_file:
+			log_file.writelines(lines)
+
+			if fsync:
+				log_file.flush()
+				os.fsync(log_file.fileno())
+
+	async def flush(self, fsync:bool = False):
+		"""Writes every queued line to the file in an executor thread, optionally fsyncing it afterwards"""
+
+		async with self._flushing:
+			oldest, lines = self._take_batch()
+			if not lines and not fsync: return
+
+			write = asyncio.get_running_loop().run_in_executor(None, self._append, lines, fsync)
+
+			try: await asyncio.shield(write) # Cancelling the executor future would drop the batch if its thread hadn't started
+
+			except asyncio.CancelledError:
+				await write # Lets the batch reach the file before the lock is released, then passes the cancellation on
+				raise
+
+		if oldest is not None:
+			self.last_flush_latency = clock.monotonic() - oldest
+			self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+
+	def flush_now(self):
+		"""Synchronously writes and fsyncs anything still queued. Used on shutdown, when the event loop may be gone"""
+
+		_, lines = self._take_batch()
+		if lines: self._append(lines, fsync = True)
+
+	def discard(self):
+		"""Drops anything still queued, for when the file is about to be deleted"""
+
+		self.queue.clear()
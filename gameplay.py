@@ -0,0 +1,348 @@
+#gameplay.py
+
+# The helpers, event handlers and phase task the command extensions share. /reload re-imports this module in place
+# before reloading the extensions, so it keeps no state of its own : that all lives in runtime.py. A phase task that is
+# already running carries on in its old loop, but picks up the new version of everything it calls from here
+
+############ IMPORTS ############
+
+import discord
+from discord import app_commands
+from runtime import bot, lean, games, member_indexes, outboxes, recent_ends, location_index, role_cache, archive, analytics, metrics
+from members import MemberIndex
+from roles import bulk_edit_roles
+from completion import MAX_CHOICES
+from metrics import current_command
+from responses import reply
+from outbox import Outbox, HIGH, NORMAL
+from clock import clock
+import os, random, asyncio, math, time
+
+########## CONSTANTS ##########
+
+STATIONARY_MINUTES = 10 # How long a runner can stay put before the hunters are told
+END_RADIUS_KM = 0.1 # How close to the end location counts as reaching it
+RECENT_END_KM = 1.0 # Locations this close to one of the guild's recent end locations aren't picked again straight away
+
+########## FUNCTIONS ##########
+
+async def get_game(interaction:discord.Interaction):
+	"""Returns the game for the channel a command was used in, telling the user if there isn't one"""
+
+	game = games.find(interaction.guild_id, interaction.channel_id)
+
+	if game is None:
+		await reply(interaction, "This channel has not been set up for Manhunt. An admin can set it up with /setup-channels")
+
+	return game
+
+def pick_end_location(game, start:str = None, min_km:float = 0.0, max_km:float = math.inf):
+	"""Picks an end location at random between min_km and max_km from `start` if it is given. Otherwise picks one at
+	random, leaving out the guild's recent end locations and anywhere within RECENT_END_KM of them, unless that leaves
+	nothing to pick from
+
+	Returns None if no location is within the distance band, or there are no locations at all
+	"""
+
+	if start: candidates = location_index.within(start, min_km, max_km)
+	else: candidates = location_index.away_from(recent_ends[game.guild_id], RECENT_END_KM) or list(location_index)
+
+	return random.choice(candidates) if candidates else None
+
+def member_index(guild:discord.Guild):
+	"""Returns the member index for a guild, building it from the member cache the first time it is needed"""
+
+	if guild.id not in member_indexes:
+		member_indexes[guild.id] = MemberIndex(guild.members)
+
+	return member_indexes[guild.id]
+
+async def load_members(guild:discord.Guild, user_ids):
+	"""Makes sure the given members are in the guild's member index, asking the gateway for any that aren't
+
+	Only lean mode ever has to ask, as otherwise every member is cached at startup
+	"""
+
+	if not lean: return
+
+	index = member_index(guild)
+	missing = [user_id for user_id in user_ids if index.get(user_id) is None]
+
+	for i in range(0, len(missing), 100): # The most one gateway request can ask for
+		for member in await guild.query_members(user_ids = missing[i:i + 100], cache = True): index.add(member)
+
+def outbox(channel):
+	"""Returns the outbound message queue for a channel, creating it the first time it is needed"""
+
+	if channel.id not in outboxes:
+		outboxes[channel.id] = Outbox(channel, observe = metrics.observe_queue_delay)
+
+	return outboxes[channel.id]
+
+def player_name(game, guild:discord.Guild, user_id:int):
+	"""Returns a player's current display name, falling back to the name they joined with"""
+
+	member = member_index(guild).get(user_id)
+	return member.display_name if member else game.players.get(user_id).name
+
+def team_names(game, guild:discord.Guild, team:str):
+	"""Returns the display names of everyone still playing on a team"""
+
+	return [player_name(game, guild, user_id) for user_id in game.players.ids(team)]
+
+def argument_name(game, guild:discord.Guild, text:str, user_id:int):
+	"""Returns how to show a player argument in a reply : the name of the player or member it resolved to, otherwise the
+	text as typed. An id picked from autocomplete that no longer resolves isn't shown, as it means nothing to the user"""
+
+	member = member_index(guild).get(user_id)
+	player = game.players.get(user_id)
+
+	if member: return member.display_name
+	if player: return player.name
+	return "That player" if text.isdigit() else text
+
+def resolve_player(guild:discord.Guild, text:str):
+	"""Returns the member id for a player argument, which is a member id when picked from autocomplete, or a typed display name"""
+
+	if text.isdigit(): return int(text)
+
+	member = member_index(guild).find(text)
+	return member.id if member else None
+
+async def reconcile_lobby(game):
+	"""Rebuilds a game's lobby by fetching every reaction on its suggestion, for when reactions were missed while offline"""
+
+	with open(game.current_path, "r") as game_file:
+		game.suggestion_id = int(game_file.read()) # Gets the message id of the suggestion, in order to collect all reactions
+
+	message = await game.bot_channel.fetch_message(game.suggestion_id)
+	lobby = {'hunters' : {}, 'runners' : {}}
+
+	for reaction in message.reactions:
+		team = game.lobby_team(str(reaction.emoji))
+
+		if team:
+			async for user in reaction.users():
+				if user.id != bot.user.id: lobby[team][user.id] = user.display_name # Discounts the bot's initial reactions
+
+	game.lobby = lobby
+	game.lobby_synced = True
+	games.save(game)
+
+async def set_player_roles(game, guild:discord.Guild, add:bool):
+	"""Adds or removes the runner and hunter roles for every player concurrently, and reports anyone who couldn't be updated"""
+
+	members = member_index(guild)
+	runner_role = role_cache.get(guild, game.RUNNER_ROLE)
+	hunter_role = role_cache.get(guild, game.HUNTER_ROLE)
+
+	runners = {user_id : members.get(user_id) for user_id in game.players.ids('runners')}
+	hunters = {user_id : members.get(user_id) for user_id in game.players.ids('hunters')}
+
+	failed_runners, failed_hunters = await asyncio.gather(bulk_edit_roles(runners, runner_role, add), bulk_edit_roles(hunters, hunter_role, add))
+	failed = failed_runners + failed_hunters # Member ids, including anyone who couldn't be found in the guild
+
+	if failed:
+		outbox(game.bot_channel).post(f"The roles of the following players could not be updated : {', '.join(player_name(game, guild, user_id) for user_id in failed)}", priority = NORMAL)
+
+	return failed
+
+async def archive_game(game, outcome:str):
+	"""Ends a game's log, streams it into the compressed archive, uploads the archive to the log channel and resets the game"""
+
+	game.log.write('end', outcome = outcome)
+	await game.log.flush(fsync = True)
+
+	name = f"{game.start_time.strftime('%d%m%Y%H%M%S')}_{game.channel_id}"
+	summary = {'guild_id' : game.guild_id, 'channel_id' : game.channel_id, 'start_time' : game.start_time.isoformat(timespec = 'seconds'), 'players' : len(game.players.players), 'outcome' : outcome, 'location' : game.end_location}
+	recent_ends[game.guild_id].append(game.end_location)
+	entry = await asyncio.get_running_loop().run_in_executor(None, archive.add, name, game.current_path, game.log.events.path, summary)
+
+	game.log.discard()
+	os.remove(game.current_path)
+	os.remove(game.log.events.path)
+
+	game.reset_vars()
+	games.save(game)
+
+	await game.log_channel.send(file = discord.File(archive.path(entry), filename = "log.txt.gz"))
+	await analytics.update()
+
+def handle_position(member_id:int, latitude:float, longitude:float, when:float):
+	"""Records a runner's live position, logging when they first come within reach of the end location in the end phase"""
+
+	for game in games:
+		if game.game_running and game.players.team_of(member_id) == 'runners':
+
+			game.positions.update(member_id, latitude, longitude, when)
+			end = location_index.coordinates(game.end_location)
+
+			if game.main_game_announced and end and member_id not in game.positions.arrived:
+				distance = game.positions.distance(member_id, *end)
+
+				if distance <= END_RADIUS_KM:
+					game.positions.arrived.add(member_id)
+					name = player_name(game, game.bot_channel.guild, member_id)
+					game.log.write('arrive', player = name, distance = round(distance, 3))
+					outbox(game.bot_channel).post(f"**{name}** has reached the end location")
+
+			return
+
+async def watch_positions(interval:float = 30.0):
+	"""Tells the hunters about runners who have stayed put for too long"""
+
+	while True:
+		await clock.sleep(interval)
+
+		for game in games:
+			if not game.game_running: continue
+
+			for member_id, seconds in game.positions.stationary(clock.time(), STATIONARY_MINUTES * 60):
+				if game.players.team_of(member_id) == 'runners':
+					outbox(game.hunter_channel).post(f"**{player_name(game, game.bot_channel.guild, member_id)}** has not moved for {seconds / 60:.0f} minutes", priority = NORMAL)
+
+async def check_game_status(game):
+	"""Sleeps until the next phase deadline (or an early wake-up) and announces each phase change as it falls due"""
+
+	current_command.set('check_game_status') # The task has its own context, so this only labels its own REST calls
+
+	while game.game_running:
+		phase = await game.scheduler.wait()
+		handled = time.perf_counter()
+
+		if phase == 'headstart':
+			outbox(game.bot_channel).post("The Manhunt game has entered the main phase, and the hunters can now leave", priority = HIGH)
+			outbox(game.hunter_channel).post("You can now leave", priority = HIGH)
+			game.log.write('phase', phase = 'headstart')
+			game.headstart_announced = True
+
+		elif phase == 'gametime':
+			outbox(game.bot_channel).post(f"The Manhunt game has entered the end phase. The end location is {game.end_location}", priority = HIGH)
+			game.log.write('phase', phase = 'gametime')
+			game.main_game_announced = True
+
+		elif phase == 'endtime':
+			outbox(game.bot_channel).post("The Manhunt game has now finished", priority = HIGH)
+			game.log.write('phase', phase = 'endtime')
+			game.end_time_announced = True
+			game.end_game = True
+
+		if phase:
+			games.save(game)
+			await game.log.flush(fsync = True)
+
+		if game.players.count('runners') == 0:
+			game.end_game = True
+
+		if game.end_game:
+
+			game.game_running = False # Stops commands (including /end-game) acting on the game while it is torn down
+			game.ending = True
+
+			await game.settle()
+			await set_player_roles(game, game.bot_channel.guild, add = False)
+
+			if game.winner:
+				outbox(game.bot_channel).post("The Manhunt game has ended. The hunters have lost!", priority = HIGH)
+				await archive_game(game, 'HUNTERS LOSE')
+			else:
+				outbox(game.bot_channel).post("The Manhunt game has ended. The hunters have won!", priority = HIGH)
+				await archive_game(game, 'HUNTERS WIN')
+
+			metrics.latency['check_game_status'].observe(time.perf_counter() - handled)
+			return # A new game may already have started while the log was uploading, and it has its own task
+
+		metrics.latency['check_game_status'].observe(time.perf_counter() - handled)
+
+########## AUTOCOMPLETE ##########
+
+def to_choices(names:list):
+	return [app_commands.Choice(name = name[:100], value = name[:100]) for name in names]
+
+def to_player_choices(index, user_ids:list):
+	return [app_commands.Choice(name = index.label(user_id)[:100], value = str(user_id)) for user_id in user_ids]
+
+async def location_autocomplete(interaction: discord.Interaction, current: str):
+	return to_choices(location_index.complete(current))
+
+async def stats_player_autocomplete(interaction: discord.Interaction, current: str):
+	return to_player_choices(analytics.completions, analytics.completions.complete(current))
+
+async def runner_autocomplete(interaction: discord.Interaction, current: str):
+
+	game = games.find(interaction.guild_id, interaction.channel_id)
+	if game is None: return []
+
+	runners = game.players.completions['runners']
+	return to_player_choices(runners, runners.complete(current))
+
+async def player_autocomplete(interaction: discord.Interaction, current: str):
+
+	game = games.find(interaction.guild_id, interaction.channel_id)
+	if game is None: return []
+
+	runners, hunters = game.players.completions['runners'], game.players.completions['hunters']
+	runner_ids = runners.complete(current)
+	hunter_ids = hunters.complete(current, MAX_CHOICES - len(runner_ids))
+
+	return to_player_choices(runners, runner_ids) + to_player_choices(hunters, hunter_ids)
+
+########## EVENTS ##########
+
+@bot.event
+async def on_member_join(member:discord.Member):
+	if member.guild.id in member_indexes: member_indexes[member.guild.id].add(member)
+
+@bot.event
+async def on_member_remove(member:discord.Member):
+	if member.guild.id in member_indexes: member_indexes[member.guild.id].remove(member)
+
+@bot.event
+async def on_member_update(before:discord.Member, after:discord.Member):
+
+	if before.display_name != after.display_name:
+		if after.guild.id in member_indexes: member_indexes[after.guild.id].add(after)
+
+		for game in games.by_guild.get(after.guild.id, []): game.players.rename(after.id, after.display_name)
+
+@bot.event
+async def on_guild_role_create(role:discord.Role):
+	role_cache.refresh(role.guild)
+
+@bot.event
+async def on_guild_role_update(before:discord.Role, after:discord.Role):
+	if before.name != after.name: role_cache.refresh(after.guild)
+
+@bot.event
+async def on_guild_role_delete(role:discord.Role):
+	role_cache.refresh(role.guild) # The role has already been taken out of guild.roles
+
+@bot.event
+async def on_raw_reaction_add(payload:discord.RawReactionActionEvent):
+
+	game = games.by_channel.get(payload.channel_id)
+
+	if game and game.lobby_synced and payload.message_id == game.suggestion_id and payload.user_id != bot.user.id:
+		team = game.lobby_team(str(payload.emoji))
+		if team:
+			game.lobby[team][payload.user_id] = payload.member.display_name if payload.member else str(payload.user_id)
+			games.save(game)
+
+			if lean and payload.member: member_index(payload.member.guild).add(payload.member) # Saves fetching them when the game starts
+
+@bot.event
+async def on_raw_reaction_remove(payload:discord.RawReactionActionEvent):
+
+	game = games.by_channel.get(payload.channel_id)
+
+	if game and game.lobby_synced and payload.message_id == game.suggestion_id:
+		team = game.lobby_team(str(payload.emoji))
+		if team and game.lobby[team].pop(payload.user_id, None):
+			games.save(game)
+
+@bot.event
+async def on_user_update(before:discord.User, after:discord.User):
+	if before.display_name != after.display_name: # Members without a nickname take their display name from the user
+		for index in member_indexes.values():
+			member = index.get(after.id)
+			if member: index.add(member)
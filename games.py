@@ -0,0 +1,235 @@
+#games.py
+
+############ IMPORTS ############
+
+from events import EventLog
+from players import PlayerTable
+from positions import PositionTable
+from scheduler import PhaseScheduler
+from store import GameStore
+import asyncio, datetime, json, os
+
+########## CLASSES ##########
+
+class Game:
+	"""Stores all of the variables and flags for one game of Manhunt, along with its channels, timers and log
+
+	Commands run concurrently on one event loop, so nothing else can run between two awaits. A command that changes the
+	game makes all of its checks and changes in one go, without awaiting in between, and only then calls Discord through
+	edit(). The few changes that have to wait on Discord part way through (suggesting, starting and unsuggesting a
+	game) hold `lock` instead, and teardown waits for every edit already started with settle()
+	"""
+
+	RUNNER_REACTION = '👟'
+	HUNTER_REACTION = '🏹'
+
+	RUNNER_ROLE = 'Runner'
+	HUNTER_ROLE = 'Hunter'
+	ADMIN_ROLE = 'Admin'
+
+	def __init__(self, guild_id:int, channel_id:int, folder:str):
+
+		self.guild_id = guild_id
+		self.channel_id = channel_id
+
+		self.bot_channel = None
+		self.hunter_channel = None
+		self.log_channel = None
+
+		os.makedirs(folder, exist_ok = True)
+		self.log = EventLog(os.path.join(folder, "current.jsonl"), os.path.join(folder, "current.txt"))
+
+		self.lock = asyncio.Lock() # Held while the game is suggested, started or unsuggested
+		self.edits = {} # Member id (None for everyone) -> the latest Discord call made for them
+
+		self.reset_vars()
+
+	@property
+	def current_path(self):
+		"""The game's 'current.txt', which holds the suggestion message id until the game starts, then the log"""
+		return self.log.text.path
+
+	@property
+	def suggestion_open(self):
+		"""Whether there is a suggestion waiting to be started. While a game runs or is torn down, 'current.txt' is its log"""
+		return os.path.exists(self.current_path) and not self.game_running and not self.ending
+
+	def edit(self, member_id:int, awaitable):
+		"""Runs a Discord call for a member (such as a role change) once any earlier calls for them have finished, and
+		returns its task. Calls for everyone at once use a member id of None, and members' calls also wait for those
+
+		The call carries on even if the command that made it is cancelled, so teardown can wait for it
+		"""
+
+		previous = [task for task in (self.edits.get(member_id), self.edits.get(None)) if task is not None]
+
+		async def run():
+			if previous: await asyncio.wait(previous)
+			return await awaitable
+
+		def finished(task):
+			if self.edits.get(member_id) is task: del self.edits[member_id]
+
+		task = asyncio.ensure_future(run())
+		self.edits[member_id] = task
+		task.add_done_callback(finished)
+
+		return task
+
+	async def settle(self):
+		"""Waits for every Discord call made through edit() so far"""
+
+		while self.edits: await asyncio.wait(list(self.edits.values()))
+
+	def reset_vars(self):
+		"""Resets all of the variables to their default values"""
+
+		self.headstart_announced = False
+		self.main_game_announced = False
+		self.end_time_announced = False
+		self.end_game = False
+		self.game_running = False
+		self.ending = False # True while the game is torn down, after game_running is cleared
+
+		self.end_location = ''
+		self.players = PlayerTable()
+		self.start_time = None
+		self.scheduler = None
+		self.phase_task = None
+		self.positions = PositionTable() # Live positions aren't saved, as they are stale by the time the bot restarts
+
+		self.winner = False
+
+		self.suggestion_id = None
+		self.lobby = {'hunters' : {}, 'runners' : {}} # Member id -> display name of everyone who has reacted to the suggestion
+		self.lobby_synced = False # False until the lobby is known to match the suggestion's reactions
+
+	def snapshot(self):
+		"""Returns everything needed to rebuild the game after a restart, as JSON-friendly values"""
+
+		return {
+			'flags' : [self.headstart_announced, self.main_game_announced, self.end_time_announced, self.end_game, self.game_running, self.winner],
+			'end_location' : self.end_location,
+			'players' : self.players.snapshot(),
+			'start_time' : self.start_time.isoformat() if self.start_time else None,
+			'scheduler' : self.scheduler.snapshot() if self.scheduler else None,
+			'suggestion_id' : self.suggestion_id,
+			'lobby' : {team : list(members.items()) for team, members in self.lobby.items()},
+			'log_seq' : self.log.seq,
+		}
+
+	def restore(self, state:dict):
+		"""Loads a snapshot taken by snapshot(). The phase task is not started here"""
+
+		self.headstart_announced, self.main_game_announced, self.end_time_announced, self.end_game, self.game_running, self.winner = state['flags']
+		self.end_location = state['end_location']
+		self.players = PlayerTable.restore(state['players'])
+		self.start_time = datetime.datetime.fromisoformat(state['start_time']) if state['start_time'] else None
+		self.scheduler = PhaseScheduler.restore(state['scheduler']) if state['scheduler'] else None
+
+		self.suggestion_id = state['suggestion_id']
+		self.lobby = {team : dict(members) for team, members in state['lobby'].items()}
+		self.lobby_synced = False # Reactions may have changed while the bot was down
+
+		self.log.seq = state['log_seq']
+
+	def lobby_team(self, emoji:str):
+		"""Returns the team a suggestion reaction joins, or None for any other emoji"""
+
+		if emoji == self.RUNNER_REACTION: return 'runners'
+		if emoji == self.HUNTER_REACTION: return 'hunters'
+		return None
+
+class GameRegistry:
+	"""Keeps one Game per configured bot channel, keyed by (guild id, channel id)
+
+	The channel config maps each bot channel id to the ids of its hunter and log channels. Any of the three channels
+	finds the same game, and a command used anywhere else in a guild with only one game falls back to that game
+	"""
+
+	def __init__(self, config_path:str = "channels.json", folder:str = "games", store_path:str = "manhunt.db"):
+
+		self.config_path = config_path
+		self.folder = folder
+		self.store = GameStore(store_path)
+
+		self.config = {}
+		if os.path.exists(config_path):
+			with open(config_path, "r") as config_file:
+				self.config = {int(channel_id) : channels for channel_id, channels in json.load(config_file).items()}
+
+		self.games = {} # (guild id, bot channel id) -> Game
+		self.by_channel = {} # bot, hunter or log channel id -> Game
+		self.by_guild = {} # guild id -> [Game]
+
+	def __iter__(self):
+		return iter(self.games.values())
+
+	def __len__(self):
+		return len(self.games)
+
+	def bind(self, get_channel):
+		"""Creates a game for every configured bot channel the client can see, and resolves its channels"""
+
+		for channel_id in self.config:
+			bot_channel = get_channel(channel_id)
+			if bot_channel is not None: self._bind_game(bot_channel, get_channel)
+
+	def _bind_game(self, bot_channel, get_channel):
+
+		channels = self.config[bot_channel.id]
+		key = (bot_channel.guild.id, bot_channel.id)
+
+		if key not in self.games:
+			game = Game(bot_channel.guild.id, bot_channel.id, os.path.join(self.folder, str(bot_channel.guild.id), str(bot_channel.id)))
+
+			state = self.store.load(bot_channel.id)
+			if state: game.restore(state) # Picks up where the game was before a restart
+			self.games[key] = game
+			self.by_guild.setdefault(game.guild_id, []).append(game)
+
+		game = self.games[key]
+		game.bot_channel = bot_channel
+		game.hunter_channel = get_channel(channels['hunter'])
+		game.log_channel = get_channel(channels['log'])
+
+		for channel_id in (bot_channel.id, channels['hunter'], channels['log']):
+			self.by_channel[channel_id] = game
+
+		return game
+
+	def configure(self, bot_channel, hunter_channel, log_channel):
+		"""Sets up (or changes) the channels for the game run from `bot_channel`, and saves the config"""
+
+		old = self.config.get(bot_channel.id)
+		if old:
+			for channel_id in (old['hunter'], old['log']):
+				if self.by_channel.get(channel_id) is self.games.get((bot_channel.guild.id, bot_channel.id)): del self.by_channel[channel_id]
+
+		self.config[bot_channel.id] = {'hunter' : hunter_channel.id, 'log' : log_channel.id}
+
+		with open(self.config_path, "w") as config_file:
+			json.dump({str(channel_id) : channels for channel_id, channels in self.config.items()}, config_file, indent = 4)
+
+		channels = {bot_channel.id : bot_channel, hunter_channel.id : hunter_channel, log_channel.id : log_channel}
+		return self._bind_game(bot_channel, channels.get)
+
+	def save(self, game):
+		"""Snapshots a game's state to the store. Called after every change to it"""
+
+		self.store.save(game.guild_id, game.channel_id, game.snapshot())
+
+	def find(self, guild_id:int, channel_id:int):
+		"""Returns the game for the channel a command was used in, or None"""
+
+		game = self.by_channel.get(channel_id)
+		if game is not None and game.guild_id == guild_id: return game
+
+		guild_games = self.by_guild.get(guild_id, [])
+		return guild_games[0] if len(guild_games) == 1 else None
+
+	def flush_now(self):
+		"""Synchronously writes out every game's queued log entries"""
+
+		for game in self:
+			game.log.flush_now()
@@ -0,0 +1,28 @@
+#gateway.py
+
+############ IMPORTS ############
+
+import discord
+
+########## FUNCTIONS ##########
+
+def client_options(lean:bool = False):
+	"""Returns the keyword arguments the bot's client is created with
+
+	By default that is every intent, with every member chunked and cached at startup and the last 1000 messages kept.
+	Lean mode asks only for what the commands use: guilds for channels and roles, members to look players up and follow
+	their nickname changes, and reactions for the suggestion lobby. Nothing is chunked at startup, members who join or
+	change aren't cached, and messages aren't cached at all, so memory no longer grows with the size of the server.
+	Players are fetched from the gateway when a game needs them instead
+	"""
+
+	if not lean:
+		intents = discord.Intents.all()
+		return {'intents' : intents}
+
+	intents = discord.Intents.none()
+	intents.guilds = True
+	intents.members = True
+	intents.guild_reactions = True
+
+	return {'intents' : intents, 'chunk_guilds_at_startup' : False, 'member_cache_flags' : discord.MemberCacheFlags.none(), 'max_messages' : None}
@@ -0,0 +1,75 @@
+#geo.py
+
+############ IMPORTS ############
+
+import collections, itertools, math
+
+########## CONSTANTS ##########
+
+EARTH_RADIUS_KM = 6371.0
+
+########## CLASSES ##########
+
+class GridIndex:
+	"""A uniform grid of named points, for finding locations within a distance band or far from other locations
+
+	Coordinates are projected onto a flat plane around the latitude of the first point added, which is accurate to well
+	under 1% across a city. Each query only visits the grid cells that could hold an answer, so it stays fast with tens
+	of thousands of points
+	"""
+
+	def __init__(self, cell_km:float = 0.5):
+
+		self.cell_km = cell_km
+		self.cells = collections.defaultdict(dict) # (column, row) -> {name : (x, y)}
+		self.points = {} # Name -> (x, y) in km
+		self.scale = None # km per degree of longitude, fixed by the first point added
+
+	def __len__(self):
+		return len(self.points)
+
+	def project(self, latitude:float, longitude:float):
+		"""Returns the (x, y) position of a coordinate, in km"""
+
+		if self.scale is None: self.scale = math.radians(EARTH_RADIUS_KM) * math.cos(math.radians(latitude))
+		return longitude * self.scale, latitude * math.radians(EARTH_RADIUS_KM)
+
+	def _cell(self, x:float, y:float):
+		return math.floor(x / self.cell_km), math.floor(y / self.cell_km)
+
+	def add(self, name:str, latitude:float, longitude:float):
+
+		self.remove(name)
+
+		point = self.project(latitude, longitude)
+		self.points[name] = point
+		self.cells[self._cell(*point)][name] = point
+
+	def remove(self, name:str):
+
+		point = self.points.pop(name, None)
+		if point is None: return
+
+		cell = self._cell(*point)
+		del self.cells[cell][name]
+		if not self.cells[cell]: del self.cells[cell]
+
+	def distance(self, first:str, second:str):
+		"""Returns the distance between two named points in km"""
+
+		return math.dist(self.points[first], self.points[second])
+
+	def within(self, latitude:float, longitude:float, min_km:float = 0.0, max_km:float = math.inf):
+		"""Returns the names of every point between min_km and max_km from a coordinate"""
+
+		x, y = self.project(latitude, longitude)
+
+		if max_km == math.inf: cells = self.cells.items()
+		else:
+			first_column, first_row = self._cell(x - max_km, y - max_km)
+			last_column, last_row = self._cell(x + max_km, y + max_km)
+
+			if (last_column - first_column + 1) * (last_row - first_row + 1) > len(self.cells): cells = self.cells.items() # Cheaper to scan every cell
+			else: cells = ((cell, self.cells[cell]) for cell in itertools.product(range(first_column, last_column + 1), range(first_row, last_row + 1)) if cell in self.cells)
+
+		return [name for _, points in cells for name, point in points.items() if min_km <= math.dist((x, y), point) <= max_km]
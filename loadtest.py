@@ -0,0 +1,394 @@
+#loadtest.py
+
+# Drives the bot's command handlers against a fake guild, without connecting to Discord, and reports per-command
+# p50/p99 latency, the number of simulated API calls and peak memory (measured in a separate pass, as tracing allocations
+# slows everything down). Run it before upgrading anything:
+#
+#     python loadtest.py --members 5000 --players 300 --latency 0.05
+#
+# --games-concurrent plays several games at once, one per guild, and reports each command's latency by the number of
+# games, which should stay flat as it grows:
+#
+#     python loadtest.py --games-concurrent 1 10 50 --members 200 --players 50 --latency 0.01
+#
+# --member-counts times start-game and end-game's teardown in guilds of each size, next to the per-player lookups they
+# make through the member index and the scans over guild.members they used to make. Only the scans should grow:
+#
+#     python loadtest.py --member-counts 1000 10000 100000 --players 300
+#
+# --locations compares the location index's near-duplicate checks with the old full scan, by list size:
+#
+#     python loadtest.py --locations 10 1000 100000
+
+############ IMPORTS ############
+
+from fakediscord import current_command, ApiCounter, FakeGuild, FakeInteraction, FakeReactionPayload, FakeUser
+from locations import LocationIndex
+from players import PlayerTable
+from responses import paginate
+from outbox import MESSAGE_LIMIT
+import discord
+import argparse, asyncio, collections, functools, importlib, os, random, shutil, sys, tempfile, time, timeit, tracemalloc
+
+########## FUNCTIONS ##########
+
+async def load_bot(folder:str):
+	"""Imports bot.py with a fresh working directory, so the run doesn't touch the real config, logs or state, and loads
+	its command extensions. Returns gameplay.py, which has the bot's state alongside the helpers and event handlers
+	"""
+
+	source = os.path.dirname(os.path.abspath(__file__))
+	sys.path.insert(0, source)
+
+	shutil.copy(os.path.join(source, "locations.txt"), folder)
+	os.makedirs(os.path.join(folder, "logs"), exist_ok = True)
+	os.chdir(folder)
+
+	entry = importlib.import_module("bot")
+	entry.bot._connection.user = FakeUser("Manhunt")
+	await entry.bot._async_setup_hook() # Binds the bot to this event loop as logging in would, so bot.dispatch() works
+	await entry.load_extensions()
+
+	return importlib.import_module("gameplay")
+
+def benchmark_permissions(bot_module, guild:FakeGuild, iterations:int = 20000):
+	"""Returns the microseconds per permission check, looking the role up by name in the guild's roles and then in the
+	member's (as every command used to), and through the bot's role cache
+	"""
+
+	member, role_cache = guild.members[0], bot_module.role_cache
+
+	scan = timeit.timeit(lambda : discord.utils.get(guild.roles, name = 'Admin') in member.roles, number = iterations)
+	cached = timeit.timeit(lambda : role_cache.has(member, 'Admin'), number = iterations)
+
+	return scan / iterations * 1e6, cached / iterations * 1e6
+
+def benchmark_roster(size:int = 1000, iterations:int = 20000):
+	"""Returns the microseconds to check a player's team and to catch them, in a roster of `size`, through the player
+	table and with the lists of display names games used to keep. The player is last in the list, as a late joiner is
+	"""
+
+	table = PlayerTable()
+	lists = {'runners' : [], 'hunters' : []}
+
+	for i in range(size):
+		team = 'hunters' if i % 4 == 0 else 'runners'
+		table.add(i, f"Player {i}", team)
+		lists[team].append(f"Player {i}")
+
+	user_id, name = size - 1, f"Player {size - 1}"
+
+	def catch_in_lists(): # There and back, so the roster is the same each time
+		lists['runners'].remove(name)
+		lists['hunters'].append(name)
+		lists['hunters'].remove(name)
+		lists['runners'].append(name)
+
+	lookups = (
+		timeit.timeit(lambda : table.team_of(user_id) == 'runners', number = iterations),
+		timeit.timeit(lambda : (table.move(user_id, 'hunters'), table.move(user_id, 'runners')), number = iterations) / 2,
+		timeit.timeit(lambda : name in lists['runners'], number = iterations),
+		timeit.timeit(catch_in_lists, number = iterations) / 2,
+	)
+
+	return [seconds / iterations * 1e6 for seconds in lookups]
+
+def location_names(count:int, rng:random.Random):
+	"""Returns `count` distinct made-up two-word place names"""
+
+	syllable = lambda : rng.choice("bcdfghjklmnprstvwyz") + rng.choice("aeiou") + (rng.choice("dklmnrst") if rng.random() < 0.4 else "")
+	word = lambda : "".join(syllable() for _ in range(rng.randint(2, 3))).capitalize()
+
+	names = set()
+	while len(names) < count: names.add(f"{word()} {word()}")
+
+	return sorted(names)
+
+def benchmark_locations(counts:list, lookups:int = 20, seed:int = 0):
+	"""Times near-duplicate checks against lists of each size, through the location index and with the scan add-location
+	used to do (fuzz.ratio against every line), and how long a page of /locations takes. Returns a row per size of
+	(locations, ms to load, ms per scan check, ms per index check, ms per page, whether the index found exactly the
+	matches a full scan does). Some of the locations are short, and are checked against spaced or dotted queries
+	"""
+
+	from fuzzywuzzy import fuzz
+	rng, rows = random.Random(seed), []
+
+	for count in counts:
+		names = location_names(count, rng)
+		short = list(dict.fromkeys("".join(rng.choices("ABCDEFGHKLMNPRSTUW", k = rng.randint(2, 4))) for _ in range(max(2, count // 100)))) # Like 'KFC' or 'UCL'
+
+		queries = [rng.choice((" ", ".")).join(name) for name in rng.sample(short, min(len(short), lookups // 5))] # 'K F C', which shares no bigram with 'KFC'
+		queries += [name[:-1] + rng.choice("aeiou") for name in rng.sample(names, lookups // 2)] # Near-duplicates
+		queries += location_names(lookups - len(queries), rng) # Then mostly new names
+		names += [name for name in short if name not in names]
+
+		with tempfile.TemporaryDirectory() as folder:
+			path = os.path.join(folder, "locations.txt")
+			with open(path, "w") as locations_file: locations_file.writelines(name + "\n" for name in names)
+
+			start = time.perf_counter()
+			index = LocationIndex(path)
+			load = time.perf_counter() - start
+
+		scanned = queries[:max(len(queries) // 2, min(lookups, 200_000 // count))] # The scan is far too slow to run every query against 100k locations
+		lines = [name + "\n" for name in names] # As read from the file, trailing newline included
+
+		start = time.perf_counter()
+		for query in scanned: any(fuzz.ratio(query, line) >= index.threshold for line in lines)
+		scan = (time.perf_counter() - start) / len(scanned)
+
+		start = time.perf_counter()
+		index_results = [index.find_similar(query) is not None for query in queries]
+		indexed = (time.perf_counter() - start) / len(queries)
+
+		exact = [any(fuzz.ratio(query, name) >= index.threshold for name in names) for query in scanned] # What the index should find
+
+		start = time.perf_counter()
+		paginate(index, MESSAGE_LIMIT - 100)[0]
+		page = time.perf_counter() - start
+
+		rows.append((count, load * 1000, scan * 1000, indexed * 1000, page * 1000, exact == index_results[:len(scanned)]))
+
+	return rows
+
+def report_locations(rows:list):
+
+	print(f"{'locations':>10}{'load ms':>10}{'scan ms':>12}{'index ms':>10}{'page ms':>10}  same result")
+
+	for count, load, scan, indexed, page, agreed in rows:
+		print(f"{count:>10}{load:>10.1f}{scan:>12.2f}{indexed:>10.3f}{page:>10.2f}  {'yes' if agreed else 'NO'}")
+
+def percentile(values:list, fraction:float):
+
+	values = sorted(values)
+	return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def invoke(bot_module, timings:dict, channel, name:str, user, **arguments):
+	"""Runs a command's handler as `user` in `channel`, adding how long it took to timings[name]"""
+
+	interaction = FakeInteraction(user, channel)
+	command = bot_module.bot.tree.get_command(name)
+	current_command.set(name) # Each invoke runs in its own task when gathered, so this only labels its own calls
+
+	start = time.perf_counter()
+	await command.callback(interaction, **arguments)
+	timings[name].append(time.perf_counter() - start)
+
+	return interaction
+
+async def fill_lobby(bot_module, timings:dict, guild:FakeGuild, game, player_count:int, players:list = None):
+	"""Suggests a game as the guild's admin, and has the first `player_count` other members (or `players`) react to join it"""
+
+	await invoke(bot_module, timings, guild.bot_channel, "suggest-game", guild.members[0])
+	suggestion = guild.bot_channel.messages[game.suggestion_id]
+
+	players = players or guild.members[1:player_count + 1]
+	hunters = max(1, len(players) // 5)
+
+	for i, member in enumerate(players):
+		emoji = game.HUNTER_REACTION if i < hunters else game.RUNNER_REACTION
+		await bot_module.on_raw_reaction_add(FakeReactionPayload(suggestion, member, emoji))
+
+async def run(bot_module, member_count:int, player_count:int, latency:float, burst:int, role_count:int = 0):
+
+	api = ApiCounter(latency)
+	guild = FakeGuild(member_count, api, role_count)
+	admin = guild.members[0]
+	admin.roles.append(guild.role('Admin'))
+
+	game = bot_module.games.configure(guild.bot_channel, guild.hunter_channel, guild.log_channel)
+	timings = collections.defaultdict(list)
+	run_command = functools.partial(invoke, bot_module, timings, guild.bot_channel)
+
+	# Game 1 : start, a burst of concurrent catches, resigns and extends, then an admin end-game
+
+	await fill_lobby(bot_module, timings, guild, game, player_count)
+	await run_command("start-game", admin)
+
+	hunters = [bot_module.member_index(guild).get(user_id) for user_id in game.players.ids('hunters')]
+	runners = game.players.ids('runners')
+
+	catches = [run_command("catch", hunters[i % len(hunters)], runner = str(runner_id)) for i, runner_id in enumerate(runners[:burst])]
+	resigns = [run_command("resign", bot_module.member_index(guild).get(runner_id)) for runner_id in runners[burst:burst * 2]]
+	extends = [run_command("extend", admin, phase = 'endtime', time = 1) for _ in range(burst)]
+	await asyncio.gather(*catches, *resigns, *extends)
+
+	if game.game_running: await run_command("end-game", admin)
+	else: print("Game 1 ran out of runners during the burst and ended itself, so /end-game wasn't timed. Use more --players or a smaller --burst")
+	while game.ending or game.game_running: await asyncio.sleep(0.01) # Game 2 can only be suggested once the teardown is over
+
+	# Game 2 : runs through every phase on the scheduler, so check_game_status announces each one and tears down
+
+	await fill_lobby(bot_module, timings, guild, game, player_count)
+	await run_command("start-game", admin)
+	if not game.game_running: raise RuntimeError("Game 2 didn't start, so check_game_status can't be timed")
+
+	game.phase_task.cancel() # Re-armed below, so its API calls are counted against check_game_status
+	scheduler = game.scheduler
+	for phase in scheduler.PHASES: scheduler.durations[phase] = 0.01
+
+	current_command.set("check_game_status")
+	start = time.perf_counter()
+	game.phase_task = asyncio.create_task(bot_module.check_game_status(game))
+	await game.phase_task
+	timings["check_game_status"].append(time.perf_counter() - start)
+
+	await asyncio.gather(*(outbox.drain() for outbox in bot_module.outboxes.values())) # Counts the queued announcements too
+
+	return timings, api, scheduler.latency, bot_module.metrics.ack_latency, benchmark_permissions(bot_module, guild)
+
+async def play_game(bot_module, timings:dict, guild:FakeGuild, player_count:int, rounds:int):
+	"""Plays one game in a guild a command at a time : a start, `rounds` rounds of a catch, a resign and an extend, then an end"""
+
+	admin = guild.members[0]
+	game = bot_module.games.configure(guild.bot_channel, guild.hunter_channel, guild.log_channel)
+	run_command = functools.partial(invoke, bot_module, timings, guild.bot_channel)
+
+	await fill_lobby(bot_module, timings, guild, game, player_count)
+	await run_command("start-game", admin)
+
+	members = bot_module.member_index(guild)
+	hunter = members.get(game.players.ids('hunters')[0])
+
+	for _ in range(rounds):
+		runners = game.players.ids('runners')
+		if len(runners) < 3: break # Leaves someone to play on until the end
+
+		await run_command("catch", hunter, runner = str(runners[0]))
+		await run_command("resign", members.get(runners[1]))
+		await run_command("extend", admin, phase = 'endtime', time = 1)
+
+	await run_command("end-game", admin)
+	return game
+
+async def run_concurrent(bot_module, counts:list, member_count:int, player_count:int, latency:float, rounds:int = 20):
+	"""Plays N games at once, each in its own guild, for every N in `counts`. Returns {N : {command : [seconds]}}
+
+	Games share nothing but the registry and the event loop, so a command's latency should stay flat as N grows
+	"""
+
+	results = {}
+
+	for count in counts:
+		api = ApiCounter(latency)
+		guilds = [FakeGuild(member_count, api) for _ in range(count)]
+		for guild in guilds: guild.members[0].roles.append(guild.role('Admin'))
+
+		timings = collections.defaultdict(list)
+		games = await asyncio.gather(*(play_game(bot_module, timings, guild, player_count, rounds) for guild in guilds))
+
+		while any(game.ending or game.game_running for game in games): await asyncio.sleep(0.01) # Lets each teardown finish before the next N
+		await asyncio.gather(*(outbox.drain() for outbox in bot_module.outboxes.values()))
+
+		results[count] = timings
+
+	return results
+
+async def run_member_counts(bot_module, counts:list, player_count:int, rounds:int = 3):
+	"""Starts and ends `rounds` games in a guild of each size in `counts`, timing the commands (end-game until its teardown
+	has finished) and a lookup of every player's display name by scanning guild.members and through the member index.
+	Returns {members : {name : [seconds]}}
+	"""
+
+	results = {}
+
+	for count in counts:
+		guild = FakeGuild(count, ApiCounter())
+		admin = guild.members[0]
+		admin.roles.append(guild.role('Admin'))
+
+		game = bot_module.games.configure(guild.bot_channel, guild.hunter_channel, guild.log_channel)
+		timings = collections.defaultdict(list)
+		players = guild.members[1::max(1, (count - 1) // player_count)][:player_count] # Spread through the guild, as they would be
+		names = [member.display_name for member in players]
+
+		for _ in range(rounds):
+			await fill_lobby(bot_module, timings, guild, game, len(players), players)
+			await invoke(bot_module, timings, guild.bot_channel, "start-game", admin)
+
+			start = time.perf_counter()
+			await invoke(bot_module, timings, guild.bot_channel, "end-game", admin)
+			while game.ending or game.game_running: await asyncio.sleep(0.001)
+			timings["teardown"].append(time.perf_counter() - start)
+
+			members = bot_module.member_index(guild)
+			timings["index lookups"].append(timeit.timeit(lambda : [members.find(name) for name in names], number = 1))
+			timings["scan lookups"].append(timeit.timeit(lambda : [discord.utils.get(guild.members, display_name = name) for name in names], number = 1))
+
+		await asyncio.gather(*(outbox.drain() for outbox in bot_module.outboxes.values()))
+		results[count] = {name : timings[name] for name in ("start-game", "teardown", "index lookups", "scan lookups")}
+
+	return results
+
+def report_member_counts(results:dict):
+
+	print(f"{'members':>8}  {'measure':<15}{'p50 ms':>10}{'max ms':>10}")
+
+	for count, timings in results.items():
+		for name, values in timings.items():
+			print(f"{count:>8}  {name:<15}{percentile(values, 0.5) * 1000:>10.2f}{max(values) * 1000:>10.2f}")
+
+def report_concurrent(results:dict):
+
+	print(f"{'games':>6}  {'command':<14}{'runs':>6}{'p50 ms':>10}{'p99 ms':>10}")
+
+	for count, timings in results.items():
+		for name, values in timings.items():
+			print(f"{count:>6}  {name:<14}{len(values):>6}{percentile(values, 0.5) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}")
+
+def report(timings:dict, api:ApiCounter, phase_latency:dict, ack_latency:dict, permission_checks:tuple, peak_memory:int, roster_checks:list):
+
+	print(f"{'command':<20}{'runs':>6}{'p50 ms':>10}{'p99 ms':>10}{'api calls':>11}")
+
+	for name, values in timings.items():
+		print(f"{name:<20}{len(values):>6}{percentile(values, 0.5) * 1000:>10.2f}{percentile(values, 0.99) * 1000:>10.2f}{api.by_command[name]:>11}")
+
+	print(f"\nAPI calls by route : {dict(api.calls)}")
+	print(f"Time to acknowledge, p99 (ms) : { {name : hist.quantile(0.99) * 1000 for name, hist in sorted(ack_latency.items())} }")
+	print(f"Phase announcement latency (ms) : { {phase : round(value * 1000, 2) for phase, value in phase_latency.items()} }")
+	print(f"Permission check (µs) : {permission_checks[0]:.2f} scanning roles by name, {permission_checks[1]:.2f} through the role cache")
+	print(f"1k roster (µs) : {roster_checks[0]:.2f} team check, {roster_checks[1]:.2f} catch (autocomplete included) through the player table, {roster_checks[2]:.2f} and {roster_checks[3]:.2f} in name lists")
+	print(f"Peak memory : {peak_memory / 1024 / 1024:.1f} MiB")
+
+########## MAIN ##########
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description = "Offline load test for the Manhunt bot")
+	parser.add_argument("--members", type = int, default = 5000, help = "Members in the fake guild")
+	parser.add_argument("--players", type = int, default = 300, help = "Players who join each game")
+	parser.add_argument("--latency", type = float, default = 0.0, help = "Seconds added to every simulated API call")
+	parser.add_argument("--burst", type = int, default = 50, help = "How many of each concurrent command to fire at once")
+	parser.add_argument("--roles", type = int, default = 0, help = "Other roles in the fake guild, listed before the game's roles")
+	parser.add_argument("--games-concurrent", type = int, nargs = "+", metavar = "N", help = "Instead, play N games at once in N guilds (of --members each), for each N given")
+	parser.add_argument("--member-counts", type = int, nargs = "+", metavar = "N", help = "Instead, time start-game and teardown in a guild of N members, for each N given")
+	parser.add_argument("--locations", type = int, nargs = "+", metavar = "N", help = "Instead, benchmark near-duplicate checks and /locations against N locations, for each N given")
+	args = parser.parse_args()
+
+	if args.locations:
+		report_locations(benchmark_locations(args.locations))
+		sys.exit()
+
+	with tempfile.TemporaryDirectory() as folder:
+		bot_module = asyncio.run(load_bot(folder))
+
+		if args.games_concurrent:
+			report_concurrent(asyncio.run(run_concurrent(bot_module, args.games_concurrent, args.members, args.players, args.latency)))
+
+		elif args.member_counts:
+			report_member_counts(asyncio.run(run_member_counts(bot_module, args.member_counts, args.players)))
+
+		else:
+			# Tracing slows every allocation several times over, so peak memory gets a pass of its own and the timings come
+			# from a second, untraced one
+			tracemalloc.start()
+			asyncio.run(run(bot_module, args.members, args.players, args.latency, args.burst, args.roles))
+			_, peak_memory = tracemalloc.get_traced_memory()
+			tracemalloc.stop()
+			bot_module.metrics.ack_latency.clear() # So the report only covers the timed pass
+
+			results = asyncio.run(run(bot_module, args.members, args.players, args.latency, args.burst, args.roles))
+			report(*results, peak_memory, benchmark_roster())
+
+		bot_module.games.store.close()
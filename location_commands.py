@@ -0,0 +1,98 @@
+#location_commands.py
+
+# The commands that manage the end locations list. A command extension, so /reload can swap it in place
+
+############ IMPORTS ############
+
+import discord
+from discord import app_commands
+from runtime import games, location_index, role_cache, metrics, responses
+from gameplay import outbox, location_autocomplete
+from games import Game
+from responses import reply, paginate
+from outbox import MESSAGE_LIMIT
+
+########## COMMANDS ##########
+
+@app_commands.command(name = "del-location", description = "Deletes a location from the end locations list")
+@app_commands.describe(location = "Location to delete from the locations list")
+@app_commands.autocomplete(location = location_autocomplete)
+@metrics.timed
+@responses.deferred
+async def del_location(interaction: discord.Interaction, location: str):
+
+	game = games.find(interaction.guild_id, interaction.channel_id)
+
+	if location_index.remove(location):
+
+		if game: outbox(game.bot_channel).post(f"**{location}** deleted from end locations list by **{interaction.user.display_name}**")
+		await reply(interaction, f"**{location}** deleted from the list of end locations")
+
+	else: await reply(interaction, f"Location **{location}** not found in end locations list")
+
+@app_commands.command(name = "add-location", description = "Adds a location to the end locations list")
+@app_commands.describe(location = "Location to add to the locations list", latitude = "The location's latitude, so end locations can be picked by distance", longitude = "The location's longitude")
+@metrics.timed
+@responses.deferred
+async def add_location(interaction: discord.Interaction, location: str, latitude: float = None, longitude: float = None):
+
+	game = games.find(interaction.guild_id, interaction.channel_id)
+
+	if (latitude is None) != (longitude is None):
+		await reply(interaction, "Give both a latitude and a longitude, or neither")
+		return
+
+	match = location_index.add(location, (latitude, longitude) if latitude is not None else None)
+
+	if match: await reply(interaction, f"**{location}** too closely matches **{match[0]}**")
+
+	else:
+		if game: outbox(game.bot_channel).post(f"**{location}** added to end locations list by **{interaction.user.display_name}**")
+		await reply(interaction, f"**{location}** added to the list of end locations")
+
+@app_commands.command(name = "import-locations", description = "Adds every location in a text file (one per line) to the end locations list")
+@app_commands.describe(file = "A text file with one location per line, optionally followed by '| latitude, longitude'")
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.ADMIN_ROLE)
+async def import_locations(interaction: discord.Interaction, file: discord.Attachment):
+
+	game = games.find(interaction.guild_id, interaction.channel_id)
+
+	content = (await file.read()).decode(errors = "replace")
+	added, rejected = location_index.add_many(content.splitlines())
+
+	message = f"Added **{len(added)}** locations to the list of end locations"
+	if rejected:
+		message += f". Skipped {len(rejected)} that too closely matched existing ones:\n"
+		message += "".join(f"**{location}** ~ **{match}**\n" for location, (match, _) in rejected[:20])
+		if len(rejected) > 20: message += f"...and {len(rejected) - 20} more"
+
+	if game and added: outbox(game.bot_channel).post(f"**{len(added)}** locations added to end locations list by **{interaction.user.display_name}**")
+	await reply(interaction, message[:2000])
+
+@app_commands.command(name = "locations", description = "Lists all the possible end locations for Manhunt, a page at a time")
+@app_commands.describe(page = "Which page of the list to show")
+@metrics.timed
+@responses.deferred
+async def locations(interaction: discord.Interaction, page: int = 1):
+
+	pages = paginate(location_index, MESSAGE_LIMIT - 100) # Leaves room for the page count
+	if not pages:
+		await reply(interaction, "There are no end locations yet. Add some with /add-location or /import-locations")
+		return
+
+	page = min(max(page, 1), len(pages))
+	message = pages[page - 1]
+	if len(pages) > 1: message += f"\n\nPage {page} of {len(pages)}. Use /locations <page> to see the others"
+
+	await reply(interaction, message)
+
+########## EXTENSION ##########
+
+COMMANDS = (del_location, add_location, import_locations, locations)
+
+async def setup(bot):
+	"""Adds this extension's commands to the tree. Unloading the extension takes them out again"""
+
+	for command in COMMANDS: bot.tree.add_command(command)
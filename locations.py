@@ -0,0 +1,222 @@
+#locations.py
+
+############ IMPORTS ############
+
+from completion import PrefixIndex, MAX_CHOICES
+from geo import GridIndex
+import collections, difflib, math, os
+
+########## FUNCTIONS ##########
+
+def bigrams(text:str):
+	"""Returns the set of two-character substrings of a string (or the string itself, if it is shorter than that)"""
+
+	if len(text) < 2: return {text}
+	return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def parse_line(line:str):
+	"""Splits a 'locations.txt' line, 'Name' or 'Name | latitude, longitude', into (name, coordinates or None)"""
+
+	name, _, coordinates = line.partition('|')
+
+	try: latitude, longitude = (float(part) for part in coordinates.split(','))
+	except ValueError: return name.strip(), None
+
+	return name.strip(), (latitude, longitude)
+
+def format_line(name:str, coordinates):
+
+	if coordinates is None: return name + '\n'
+	return f"{name} | {coordinates[0]}, {coordinates[1]}\n"
+
+########## CLASSES ##########
+
+class LocationIndex:
+	"""Holds the end locations in memory, backed by 'locations.txt', with a bigram index for finding near-duplicates
+
+	A location is only scored with fuzz.ratio if its length is close enough for the ratio to possibly reach the
+	threshold, and it shares enough bigrams with the query to. Short or spaced-out names can match without sharing any
+	('KFC' and 'K F C'), so those lengths are looked up by length instead. A check touches a handful of entries rather
+	than the whole list
+
+	fuzzywuzzy is only imported the first time a location is checked, as nothing else needs it and it slows startup
+	"""
+
+	def __init__(self, path:str = "locations.txt", threshold:int = 75):
+
+		self.path = path
+		self.threshold = threshold
+
+		self.locations = {} # Location -> (latitude, longitude) or None, in file order
+		self.grams = collections.defaultdict(set) # Bigram -> locations containing it
+		self.lengths = collections.defaultdict(set) # Length -> locations that long
+		self.prefix = PrefixIndex()
+		self.spatial = GridIndex() # Only the locations with coordinates
+
+		if os.path.exists(path):
+			with open(path, "r") as locations_file:
+				for line in locations_file:
+					if line.strip(): self._insert(*parse_line(line))
+
+	def __contains__(self, location:str):
+		return location in self.locations
+
+	def __iter__(self):
+		return iter(self.locations)
+
+	def __len__(self):
+		return len(self.locations)
+
+	def _insert(self, location:str, coordinates = None):
+
+		self.locations[location] = coordinates
+		self.prefix.add(location)
+		for gram in bigrams(location): self.grams[gram].add(location)
+		self.lengths[len(location)].add(location)
+		if coordinates: self.spatial.add(location, *coordinates)
+
+	def coordinates(self, location:str):
+		"""Returns a location's (latitude, longitude), or None if it has none"""
+
+		return self.locations.get(location)
+
+	def within(self, location:str, min_km:float, max_km:float):
+		"""Returns the locations between min_km and max_km from another location, or None if it has no coordinates"""
+
+		coordinates = self.coordinates(location)
+		if coordinates is None: return None
+
+		return [name for name in self.spatial.within(*coordinates, min_km, max_km) if name != location]
+
+	def away_from(self, locations:list, min_km:float):
+		"""Returns every location except the given ones and any with coordinates within min_km of them. Locations without
+		coordinates are always included, as their distance isn't known
+		"""
+
+		near = set(locations)
+		for location in locations:
+			coordinates = self.locations.get(location)
+			if coordinates: near.update(self.spatial.within(*coordinates, 0.0, min_km))
+
+		return [location for location in self.locations if location not in near]
+
+	def find_similar(self, location:str):
+		"""Returns (existing location, score) for the closest location scoring at least the threshold, or None"""
+
+		from fuzzywuzzy import fuzz
+
+		grams = bigrams(location)
+		repeated = max(0, len(location) - 1 - len(grams)) # Bigrams the location has more than once
+
+		# ratio = 2 * matches / total length, and matches can't exceed the shorter length, which bounds the length gap
+		minimum = (self.threshold - 0.5) / 200 # Fewest matches per character of total length, as fuzz.ratio rounds
+		limit = (self.threshold - 0.5) / (200 - self.threshold + 0.5)
+
+		def close_in_length(length:int):
+			shorter, longer = sorted((len(location), length))
+			return shorter >= longer * limit
+
+		def needed(length:int): # Fewest bigrams a location of this length must share to reach the threshold
+			# A character of either string outside the matches can break at most two of its bigrams (and each gap between
+			# matching blocks needs such a character), so too few shared bigrams means too few matches
+			total = len(location) + length
+			return 3 * math.ceil(minimum * total - 1e-9) - total - 1 - repeated
+
+		shared = collections.Counter()
+		for gram in grams:
+			shared.update(self.grams.get(gram, ()))
+
+		candidates = shared.most_common()
+		for length, names in self.lengths.items(): # Lengths that can match without a shared bigram
+			if needed(length) <= 0 and close_in_length(length):
+				candidates.extend((name, 0) for name in names if name not in shared)
+
+		best = None
+		matcher = difflib.SequenceMatcher(None, '', location)
+
+		for candidate, count in candidates:
+			if not close_in_length(len(candidate)): continue
+			if count < needed(len(candidate)): continue # Far cheaper than quick_ratio, and it rules out most candidates
+
+			matcher.set_seq1(candidate)
+			if matcher.quick_ratio() * 100 < self.threshold - 0.5: continue # Not enough characters in common
+
+			score = fuzz.ratio(location, candidate)
+			if score >= self.threshold and (best is None or score > best[1]): best = (candidate, score)
+
+		return best
+
+	def complete(self, text:str, limit:int = MAX_CHOICES):
+		"""Returns up to `limit` locations for autocomplete: word-prefix matches first, then the closest fuzzy matches"""
+
+		results = self.prefix.complete(text, limit)
+
+		if len(results) < limit and len(text.strip()) > 1:
+			shared = collections.Counter()
+			for gram in bigrams(text.strip()):
+				shared.update(self.grams.get(gram, ()))
+
+			for location, _ in shared.most_common(limit):
+				if len(results) >= limit: break
+				if location not in results: results.append(location)
+
+		return results
+
+	def add(self, location:str, coordinates = None):
+		"""Adds a location and saves it, unless it too closely matches an existing one. Returns that match, or None"""
+
+		location = location.strip()
+		match = self.find_similar(location)
+		if match: return match
+
+		self._insert(location, coordinates)
+
+		with open(self.path, "a") as locations_file:
+			locations_file.write(format_line(location, coordinates))
+
+		return None
+
+	def add_many(self, new_locations):
+		"""Adds a batch of locations with a single write, skipping near-duplicates of the list or of earlier ones in the batch
+
+		Each line is in the same format as 'locations.txt'. Returns (added locations, [(rejected location, (match, score))])
+		"""
+
+		added, rejected = [], []
+
+		for line in new_locations:
+			location, coordinates = parse_line(line)
+			if not location: continue
+
+			match = self.find_similar(location)
+			if match: rejected.append((location, match))
+
+			else:
+				self._insert(location, coordinates)
+				added.append(location)
+
+		if added:
+			with open(self.path, "a") as locations_file:
+				locations_file.writelines(format_line(location, self.locations[location]) for location in added)
+
+		return added, rejected
+
+	def remove(self, location:str):
+		"""Removes a location and saves the list. Returns False if it wasn't in the list"""
+
+		if location not in self.locations: return False
+
+		del self.locations[location]
+		self.prefix.remove(location)
+		self.spatial.remove(location)
+		for gram in bigrams(location):
+			self.grams[gram].discard(location)
+			if not self.grams[gram]: del self.grams[gram]
+
+		self.lengths[len(location)].discard(location)
+		if not self.lengths[len(location)]: del self.lengths[len(location)]
+
+		with open(self.path, "w") as locations_file:
+			locations_file.writelines(format_line(location, coordinates) for location, coordinates in self.locations.items())
+
+		return True
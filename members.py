@@ -0,0 +1,45 @@
+#members.py
+
+########## CLASSES ##########
+
+class MemberIndex:
+	"""Indexes a guild's members by id and by display name, so lookups don't scan the whole member list"""
+
+	def __init__(self, members = ()):
+
+		self.by_id = {}
+		self.by_name = {}
+		self.names = {} # member id -> the display name it is currently indexed under
+
+		for member in members: self.add(member)
+
+	def __len__(self):
+		return len(self.by_id)
+
+	def add(self, member):
+		"""Adds (or re-indexes) a member"""
+
+		self.remove(member)
+
+		self.by_id[member.id] = member
+		self.by_name[member.display_name] = member
+		self.names[member.id] = member.display_name
+
+	def remove(self, member):
+		"""Removes a member from the index, if present"""
+
+		self.by_id.pop(member.id, None)
+		old_name = self.names.pop(member.id, None)
+
+		if old_name is not None and self.by_name.get(old_name) is not None and self.by_name[old_name].id == member.id:
+			del self.by_name[old_name]
+
+	def get(self, member_id:int):
+		"""Returns the member with the given id, or None"""
+
+		return self.by_id.get(member_id)
+
+	def find(self, display_name:str):
+		"""Returns the member with the given display name, or None"""
+
+		return self.by_name.get(display_name)
@@ -0,0 +1,113 @@
+#memreport.py
+
+# Measures how much resident memory the bot's discord.py caches take in a guild of a given size, with the default
+# configuration (every intent, every member chunked at startup) and with lean mode (MANHUNT_LEAN). Each measurement
+# runs in a fresh process, filling a real client's caches offline the way the gateway would:
+#
+#     python memreport.py --members 1000 10000 100000 --players 300
+
+############ IMPORTS ############
+
+from gateway import client_options
+from members import MemberIndex
+import discord
+import argparse, gc, json, os, subprocess, sys
+
+########## CONSTANTS ##########
+
+ONLINE_FRACTION = 0.2 # Members with a presence (and an activity) when presences are on
+CACHED_MESSAGES = 1000 # discord.py's default max_messages
+CHUNK_SIZE = 1000 # Members per GUILD_MEMBERS_CHUNK, as the gateway sends them
+
+########## FUNCTIONS ##########
+
+def resident_bytes():
+
+	with open("/proc/self/statm") as statm:
+		return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def user_payload(i:int):
+	return {'id' : str(10 ** 17 + i), 'username' : f"member{i}", 'global_name' : f"Member {i}", 'discriminator' : '0', 'avatar' : f"{i:032x}", 'public_flags' : 0}
+
+def member_payload(i:int, role_ids:list):
+	return {'user' : user_payload(i), 'roles' : role_ids[i % len(role_ids):][:2], 'joined_at' : '2023-01-01T00:00:00+00:00', 'nick' : None, 'deaf' : False, 'mute' : False, 'flags' : 0}
+
+def presence_payload(i:int):
+	return {'user' : {'id' : str(10 ** 17 + i)}, 'status' : 'online', 'client_status' : {'desktop' : 'online'},
+		'activities' : [{'name' : 'Spotify', 'type' : 2, 'state' : f"Artist {i}", 'details' : f"Song {i}", 'created_at' : 0}]}
+
+def guild_payload(guild_id:int, role_ids:list):
+	return {
+		'id' : str(guild_id), 'name' : "Manhunt", 'member_count' : 0, 'large' : True, 'features' : [], 'emojis' : [], 'stickers' : [],
+		'roles' : [{'id' : str(role_id), 'name' : f"role{role_id}", 'permissions' : '0', 'position' : i, 'color' : 0, 'hoist' : False, 'managed' : False, 'mentionable' : False} for i, role_id in enumerate(role_ids)],
+		'channels' : [{'id' : str(guild_id + i), 'type' : 0, 'name' : name, 'position' : i, 'permission_overwrites' : []} for i, name in enumerate(("manhunt", "hunters", "logs"), 1)],
+	}
+
+def message_payload(i:int, channel_id:int):
+	return {'id' : str(10 ** 18 + i), 'channel_id' : str(channel_id), 'author' : user_payload(i), 'content' : "Anyone up for a game tonight? " * 3,
+		'timestamp' : '2023-01-01T00:00:00+00:00', 'edited_timestamp' : None, 'tts' : False, 'mention_everyone' : False, 'mentions' : [],
+		'mention_roles' : [], 'attachments' : [], 'embeds' : [], 'pinned' : False, 'type' : 0}
+
+def measure(mode:str, member_count:int, player_count:int):
+	"""Fills a client's caches as a guild of `member_count` would, and returns the resident bytes they added"""
+
+	lean = mode == 'lean'
+	client = discord.Client(**client_options(lean))
+	state = client._connection
+
+	gc.collect()
+	before = resident_bytes()
+
+	role_ids = [10 ** 16 + i for i in range(50)]
+	guild = discord.Guild(data = guild_payload(10 ** 15, role_ids), state = state)
+	state._add_guild(guild)
+
+	def add_members(indexes):
+
+		for start in range(0, len(indexes), CHUNK_SIZE):
+			for i in indexes[start:start + CHUNK_SIZE]:
+				member = discord.Member(data = member_payload(i, role_ids), guild = guild, state = state)
+
+				if state._intents.presences and i % int(1 / ONLINE_FRACTION) == 0:
+					presence = presence_payload(i)
+					member._presence_update(discord.RawPresenceUpdateEvent(data = presence, state = state), presence['user'])
+
+				guild._add_member(member)
+
+	if state._chunk_guilds: add_members(range(member_count)) # Every member, chunked at startup
+	else: add_members(range(min(player_count, member_count))) # Only the players, fetched when their game starts
+
+	if state._messages is not None:
+		channel = guild.text_channels[0]
+		for i in range(CACHED_MESSAGES): state._messages.append(discord.Message(state = state, channel = channel, data = message_payload(i, channel.id)))
+
+	index = MemberIndex(guild.members) # The bot's own index, over whichever members are cached
+
+	gc.collect()
+	return resident_bytes() - before
+
+def report(member_counts:list, player_count:int):
+
+	print(f"{'members':>10}{'default MiB':>14}{'lean MiB':>11}")
+
+	for member_count in member_counts:
+		results = {}
+
+		for mode in ('default', 'lean'):
+			output = subprocess.run([sys.executable, __file__, "--measure", mode, "--members", str(member_count), "--players", str(player_count)], capture_output = True, text = True, check = True).stdout
+			results[mode] = json.loads(output) / 1024 / 1024
+
+		print(f"{member_count:>10}{results['default']:>14.1f}{results['lean']:>11.1f}")
+
+########## MAIN ##########
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description = "Reports the memory the bot's caches use, by guild size, with and without lean mode")
+	parser.add_argument("--members", type = int, nargs = "+", default = [1000, 10000, 100000])
+	parser.add_argument("--players", type = int, default = 300, help = "Players in the game, which lean mode fetches")
+	parser.add_argument("--measure", choices = ("default", "lean"), help = argparse.SUPPRESS) # Used by report() to run each measurement in its own process
+	args = parser.parse_args()
+
+	if args.measure: print(measure(args.measure, args.members[0], args.players))
+	else: report(args.members, args.players)
@@ -0,0 +1,239 @@
+#metrics.py
+
+############ IMPORTS ############
+
+import asyncio, bisect, collections, contextvars, functools, time
+
+########## CONSTANTS ##########
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # Seconds, as in the Prometheus client defaults
+
+current_command = contextvars.ContextVar('current_command', default = None) # Which command a REST call is made on behalf of
+
+########## CLASSES ##########
+
+class Histogram:
+	"""A cumulative-bucket latency histogram, in the shape Prometheus expects"""
+
+	def __init__(self):
+
+		self.counts = [0] * (len(BUCKETS) + 1) # The last bucket is +Inf
+		self.count = 0
+		self.sum = 0.0
+		self.max = 0.0
+
+	def observe(self, value:float):
+
+		self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+		self.count += 1
+		self.sum += value
+		self.max = max(self.max, value)
+
+	def quantile(self, fraction:float):
+		"""Returns the upper bound of the bucket holding the given quantile"""
+
+		target = fraction * self.count
+		running = 0
+
+		for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+			running += count
+			if running >= target: return bound
+
+		return float('inf')
+
+class Metrics:
+	"""Collects command latencies, errors, outbound REST calls and event loop lag"""
+
+	def __init__(self, started:float = None):
+
+		self.started = started if started is not None else time.perf_counter() # When the process started
+		self.startup = {} # Stage ('ready', 'first_command') -> seconds after the process started
+		self.restore = None # (games, seconds) it took to restore every saved game when the bot came back up
+
+		self.latency = collections.defaultdict(Histogram) # Command -> Histogram
+		self.ack_latency = collections.defaultdict(Histogram) # Command -> seconds until the interaction was acknowledged
+		self.errors = collections.Counter() # Command -> unhandled exceptions
+		self.requests = collections.Counter() # (command, 'METHOD /route') -> REST calls
+		self.queue_delay = collections.defaultdict(Histogram) # Outbox priority -> seconds messages waited to be sent
+		self.loop_lag = Histogram()
+		self.last_loop_lag = 0.0
+		self.log_writers = lambda : () # Returns the LogWriters to report on, see watch_logs()
+
+		self._server = None
+		self._lag_task = None
+
+	def timed(self, func):
+		"""Decorates a command handler so its latency, errors and REST calls are recorded under the command's name"""
+
+		name = func.__name__.replace('_', '-')
+
+		@functools.wraps(func)
+		async def wrapper(*args, **kwargs):
+
+			current_command.set(name)
+			start = time.perf_counter()
+
+			try: return await func(*args, **kwargs)
+
+			except Exception:
+				self.errors[name] += 1
+				raise
+
+			finally:
+				self.latency[name].observe(time.perf_counter() - start)
+				self.mark_startup('first_command')
+
+		return wrapper
+
+	def instrument_http(self, http):
+		"""Wraps a discord.py HTTPClient so every REST request is counted against the command that made it"""
+
+		request = http.request
+		if getattr(request, 'instrumented', False): return
+
+		@functools.wraps(request)
+		async def counted_request(route, **kwargs):
+			self.requests[(current_command.get() or 'background', f"{route.method} {route.path}")] += 1
+			return await request(route, **kwargs)
+
+		counted_request.instrumented = True
+		http.request = counted_request
+
+	def mark_startup(self, stage:str):
+		"""Records how long after the process started a stage was first reached"""
+
+		if stage not in self.startup: self.startup[stage] = time.perf_counter() - self.started
+
+	def mark_restore(self, game_count:int, seconds:float):
+		"""Records how long restoring the saved games took on startup, and how many games there were"""
+
+		self.restore = (game_count, seconds)
+
+	def observe_ack(self, command:str, seconds:float):
+		self.ack_latency[command].observe(seconds)
+
+	def observe_queue_delay(self, priority:str, seconds:float):
+		self.queue_delay[priority].observe(seconds)
+
+	def watch_logs(self, writers):
+		"""Reports the queue depth and flush latency of every LogWriter that `writers()` returns. It is called each time the
+		metrics are read, so games set up later are included"""
+
+		self.log_writers = writers
+
+	def count_requests(self, match:str):
+		"""Returns the number of REST calls whose route contains `match`"""
+
+		return sum(count for (_, route), count in self.requests.items() if match in route)
+
+	async def _measure_loop_lag(self, interval:float):
+
+		while True:
+			start = time.perf_counter()
+			await asyncio.sleep(interval)
+
+			self.last_loop_lag = time.perf_counter() - start - interval
+			self.loop_lag.observe(self.last_loop_lag)
+
+	async def start(self, port:int, interval:float = 0.5):
+		"""Starts the event loop lag probe, and the Prometheus endpoint on localhost:<port>/metrics (if port is non-zero)"""
+
+		if self._lag_task is None:
+			self._lag_task = asyncio.create_task(self._measure_loop_lag(interval))
+
+		if port and self._server is None:
+			self._server = await asyncio.start_server(self._serve, "127.0.0.1", port)
+
+	async def _serve(self, reader, writer):
+
+		request_line = await reader.readline()
+		while (await reader.readline()).strip(): pass # Skips the headers
+
+		if request_line.split(b' ')[1:2] == [b'/metrics']:
+			body, status = self.prometheus().encode(), "200 OK"
+		else:
+			body, status = b"Not found\n", "404 Not Found"
+
+		writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+		await writer.drain()
+		writer.close()
+
+	def prometheus(self):
+		"""Renders every metric in the Prometheus text exposition format"""
+
+		lines = []
+
+		def histogram(name:str, help_text:str, histograms:dict):
+
+			lines.append(f"# HELP {name} {help_text}")
+			lines.append(f"# TYPE {name} histogram")
+
+			for labels, hist in histograms.items():
+				running = 0
+				for bound, count in zip(BUCKETS + (float('inf'),), hist.counts):
+					running += count
+					le = "+Inf" if bound == float('inf') else bound
+					lines.append(f'{name}_bucket{{{labels}le="{le}"}} {running}')
+
+				lines.append(f"{name}_sum{{{labels.rstrip(',')}}} {hist.sum}")
+				lines.append(f"{name}_count{{{labels.rstrip(',')}}} {hist.count}")
+
+		histogram("manhunt_command_seconds", "Time taken to handle each command", {f'command="{name}",' : hist for name, hist in self.latency.items()})
+		histogram("manhunt_command_ack_seconds", "Time taken to acknowledge each command's interaction", {f'command="{name}",' : hist for name, hist in self.ack_latency.items()})
+		histogram("manhunt_outbox_delay_seconds", "Time messages spent queued before being sent", {f'priority="{name}",' : hist for name, hist in self.queue_delay.items()})
+		histogram("manhunt_event_loop_lag_seconds", "How late the event loop woke a sleeping task", {'' : self.loop_lag})
+
+		lines.append("# HELP manhunt_startup_seconds Seconds from process start until each startup stage was reached")
+		lines.append("# TYPE manhunt_startup_seconds gauge")
+		lines.extend(f'manhunt_startup_seconds{{stage="{stage}"}} {seconds}' for stage, seconds in self.startup.items())
+
+		if self.restore:
+			lines.append("# HELP manhunt_restore_seconds Seconds taken to restore every saved game on startup")
+			lines.append("# TYPE manhunt_restore_seconds gauge")
+			lines.append(f"manhunt_restore_seconds {self.restore[1]}")
+			lines.append("# HELP manhunt_restored_games Games restored on startup")
+			lines.append("# TYPE manhunt_restored_games gauge")
+			lines.append(f"manhunt_restored_games {self.restore[0]}")
+
+		writers = list(self.log_writers())
+		for name, help_text, value in (
+			("manhunt_log_queue_depth", "Lines queued in memory for each game log, not yet written", lambda writer : writer.queue_depth),
+			("manhunt_log_last_flush_seconds", "How long the oldest line in each game log's last batch waited to be written", lambda writer : writer.last_flush_latency),
+			("manhunt_log_max_flush_seconds", "The longest any line in each game log has waited to be written", lambda writer : writer.max_flush_latency),
+		):
+			lines.append(f"# HELP {name} {help_text}")
+			lines.append(f"# TYPE {name} gauge")
+			lines.extend(f'{name}{{log="{writer.path}"}} {value(writer)}' for writer in writers)
+
+		lines.append("# HELP manhunt_command_errors_total Unhandled exceptions raised by each command")
+		lines.append("# TYPE manhunt_command_errors_total counter")
+		lines.extend(f'manhunt_command_errors_total{{command="{name}"}} {count}' for name, count in self.errors.items())
+
+		lines.append("# HELP manhunt_rest_requests_total REST requests made to Discord, by command and route")
+		lines.append("# TYPE manhunt_rest_requests_total counter")
+		lines.extend(f'manhunt_rest_requests_total{{command="{name}",route="{route}"}} {count}' for (name, route), count in self.requests.items())
+
+		return "\n".join(lines) + "\n"
+
+	def summary(self):
+		"""A short human-readable summary, for the /bot-stats command"""
+
+		lines = ["**Command** : runs, p50, p99, max, p99 to acknowledge, errors, REST calls"]
+
+		for name, hist in sorted(self.latency.items()):
+			rest_calls = sum(count for (command, _), count in self.requests.items() if command == name)
+			ack = f"≤{self.ack_latency[name].quantile(0.99) * 1000:g}ms" if name in self.ack_latency else "-"
+			lines.append(f"{name} : {hist.count}, ≤{hist.quantile(0.5) * 1000:g}ms, ≤{hist.quantile(0.99) * 1000:g}ms, {hist.max * 1000:.0f}ms, {ack}, {self.errors[name]}, {rest_calls}")
+
+		lines.append(f"\nMessages sent : {self.count_requests('POST /channels/{channel_id}/messages')}")
+		lines.append(f"Role edits : {self.count_requests('/roles/{role_id}')}")
+		lines.extend(f"Outbox delay ({name}) : ≤{hist.quantile(0.5) * 1000:g}ms p50, {hist.max * 1000:.0f}ms max" for name, hist in sorted(self.queue_delay.items()))
+		lines.append("Startup : " + ", ".join(f"{stage} after {seconds:.2f}s" for stage, seconds in self.startup.items()))
+		if self.restore: lines.append(f"Restore : {self.restore[0]} games in {self.restore[1] * 1000:.1f}ms")
+		lines.append(f"Event loop lag : {self.last_loop_lag * 1000:.1f}ms now, {self.loop_lag.max * 1000:.1f}ms max")
+
+		writers = list(self.log_writers())
+		if writers:
+			lines.append(f"Game logs : {sum(writer.queue_depth for writer in writers)} lines queued, {max(writer.last_flush_latency for writer in writers) * 1000:.0f}ms latest flush, {max(writer.max_flush_latency for writer in writers) * 1000:.0f}ms slowest")
+
+		return "\n".join(lines)
@@ -0,0 +1,98 @@
+#outbox.py
+
+############ IMPORTS ############
+
+from clock import clock
+import asyncio, contextvars, heapq, itertools
+
+########## CONSTANTS ##########
+
+HIGH, NORMAL, LOW = 0, 1, 2 # Phase changes and game ends, standalone announcements, and event lines that can be merged
+PRIORITY_NAMES = {HIGH : 'high', NORMAL : 'normal', LOW : 'low'}
+
+MESSAGE_LIMIT = 2000 # The longest message Discord accepts
+
+########## CLASSES ##########
+
+class Outbox:
+	"""Sends a channel's messages one at a time from a background task, highest priority first
+
+	Low priority lines that arrive within `window` seconds of each other are merged into as few messages as fit under
+	the message limit, so a burst of catches is one message rather than dozens hitting the channel's rate limit
+	"""
+
+	def __init__(self, channel, window:float = 0.5, observe = None):
+
+		self.channel = channel
+		self.window = window
+		self.observe = observe # Called with (priority name, seconds queued) for every line sent, if given
+
+		self.queue = [] # Heap of (priority, order, enqueue time, content)
+		self.order = itertools.count() # Keeps messages of the same priority in the order they were posted
+
+		self.sending = False
+
+		self._task = None
+		self._ready = None # Set when anything is posted
+		self._urgent = None # Set when something is posted that shouldn't wait out the merge window
+
+	def __len__(self):
+		return len(self.queue)
+
+	def post(self, content:str, priority:int = LOW):
+		"""Queues a message. The background task is started on first use"""
+
+		heapq.heappush(self.queue, (priority, next(self.order), clock.monotonic(), content))
+
+		if self._task is None:
+			self._ready, self._urgent = asyncio.Event(), asyncio.Event()
+			loop = asyncio.get_running_loop()
+			self._task = contextvars.Context().run(loop.create_task, self._run()) # Not attributed to whichever command posted first
+
+		self._ready.set()
+		if priority != LOW: self._urgent.set()
+
+	def _take_message(self):
+		"""Pops the next message to send, merging consecutive low priority lines up to the message limit"""
+
+		priority, _, queued, content = heapq.heappop(self.queue)
+		lines = [(queued, content)]
+
+		if priority == LOW:
+			length = len(content)
+			while self.queue and self.queue[0][0] == LOW and length + 1 + len(self.queue[0][3]) <= MESSAGE_LIMIT:
+				_, _, queued, content = heapq.heappop(self.queue)
+				lines.append((queued, content))
+				length += 1 + len(content)
+
+		return priority, lines
+
+	async def _run(self):
+
+		while True:
+			await self._ready.wait()
+
+			if self.queue and self.queue[0][0] == LOW and not self._urgent.is_set(): # Gives other low priority lines a chance to arrive
+				await clock.wait_event(self._urgent, self.window)
+
+			while self.queue:
+				self._urgent.clear()
+				priority, lines = self._take_message()
+
+				self.sending = True
+				try: await self.channel.send("\n".join(content for _, content in lines)[:MESSAGE_LIMIT])
+				except Exception as e: print(f"Could not send a message to {self.channel.name} : {e}")
+				finally: self.sending = False
+
+				if self.observe:
+					sent = clock.monotonic()
+					for queued, _ in lines: self.observe(PRIORITY_NAMES[priority], sent - queued)
+
+				if self.queue and self.queue[0][0] == LOW and not self._urgent.is_set(): break # Waits for the next window
+
+			if not self.queue: self._ready.clear()
+
+	async def drain(self):
+		"""Waits until everything queued has been sent"""
+
+		while self.queue or self.sending: await clock.sleep(self.window / 10)
@@ -0,0 +1,69 @@
+#permissions.py
+
+############ IMPORTS ############
+
+from responses import reply
+import discord
+import functools
+
+########## CONSTANTS ##########
+
+DENIED_MESSAGE = "You do not have the required permissions to use this command"
+
+########## CLASSES ##########
+
+class RoleCache:
+	"""The ids of each guild's game roles, looked up by name once and refreshed whenever a guild's roles change
+
+	A role is then found with the guild's own id lookup, and a member's role checked with theirs, instead of scanning
+	every role in the guild and every role the member has on each command
+	"""
+
+	def __init__(self, names:tuple):
+
+		self.names = set(names)
+		self.ids = {} # Guild id -> {role name : role id}
+
+	def refresh(self, guild:discord.Guild):
+		"""Re-reads a guild's game roles. Called on any role create, update or delete in the guild"""
+
+		ids = {}
+		for role in guild.roles:
+			if role.name in self.names: ids.setdefault(role.name, role.id) # The first of any duplicates, as discord.utils.get picks
+
+		self.ids[guild.id] = ids
+
+	def role_id(self, guild:discord.Guild, name:str):
+
+		if guild.id not in self.ids: self.refresh(guild)
+		return self.ids[guild.id].get(name)
+
+	def get(self, guild:discord.Guild, name:str):
+		"""Returns a guild's role with the given name, or None"""
+
+		role_id = self.role_id(guild, name)
+		return None if role_id is None else guild.get_role(role_id)
+
+	def has(self, member:discord.Member, name:str):
+		"""Whether a member has the role with the given name"""
+
+		role_id = self.role_id(member.guild, name)
+		return role_id is not None and member.get_role(role_id) is not None
+
+	def requires(self, name:str):
+		"""Decorates a command handler so it only runs for members with the named role, and tells anyone else they can't use it"""
+
+		def decorator(func):
+
+			@functools.wraps(func)
+			async def wrapper(interaction:discord.Interaction, *args, **kwargs):
+
+				if not self.has(interaction.user, name):
+					await reply(interaction, DENIED_MESSAGE)
+					return
+
+				return await func(interaction, *args, **kwargs)
+
+			return wrapper
+
+		return decorator
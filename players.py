@@ -0,0 +1,106 @@
+#players.py
+
+############ IMPORTS ############
+
+from completion import PrefixIndex
+from clock import clock
+
+########## CLASSES ##########
+
+class Player:
+	"""One member's place in a game"""
+
+	__slots__ = ('id', 'name', 'team', 'joined', 'status')
+
+	def __init__(self, member_id:int, name:str, team:str):
+
+		self.id = member_id
+		self.name = name # Display name when they joined, only used if the member can't be looked up
+		self.team = team # 'runners' or 'hunters'
+		self.joined = clock.time()
+		self.status = 'playing' # Or 'resigned', 'disqualified' or 'won'
+
+class PlayerTable:
+	"""The players of a game keyed by member id, with O(1) membership checks and team changes
+
+	Players who leave keep their entry with a new status, so the game keeps a record of everyone who took part
+	"""
+
+	def __init__(self):
+
+		self.players = {} # Member id -> Player
+		self.teams = {'runners' : set(), 'hunters' : set()} # Ids of the players still playing on each team
+		self.completions = {'runners' : PrefixIndex(), 'hunters' : PrefixIndex()} # For autocomplete, by display name
+
+	def __len__(self):
+		return len(self.teams['runners']) + len(self.teams['hunters'])
+
+	def snapshot(self):
+		return [[player.id, player.name, player.team, player.joined, player.status] for player in self.players.values()]
+
+	@classmethod
+	def restore(cls, rows:list):
+
+		table = cls()
+
+		for member_id, name, team, joined, status in rows:
+			table.add(member_id, name, team)
+			table.players[member_id].joined = joined
+			if status != 'playing': table.remove(member_id, status)
+
+		return table
+
+	def get(self, member_id:int):
+		return self.players.get(member_id)
+
+	def team_of(self, member_id:int):
+		"""Returns 'runners' or 'hunters' for someone still playing, otherwise None"""
+
+		player = self.players.get(member_id)
+		return player.team if player and player.status == 'playing' else None
+
+	def count(self, team:str):
+		return len(self.teams[team])
+
+	def ids(self, team:str):
+		return list(self.teams[team])
+
+	def add(self, member_id:int, name:str, team:str):
+		"""Adds a player to a team, or rejoins someone who left earlier"""
+
+		self.players[member_id] = Player(member_id, name, team)
+		self.teams[team].add(member_id)
+		self.completions[team].add(name, member_id)
+
+	def remove(self, member_id:int, status:str):
+		"""Takes a player out of the game, recording why"""
+
+		player = self.players[member_id]
+		player.status = status
+
+		self.teams[player.team].discard(member_id)
+		self.completions[player.team].remove(member_id)
+
+	def move(self, member_id:int, team:str):
+		"""Moves a player to the other team"""
+
+		player = self.players[member_id]
+
+		self.teams[player.team].discard(member_id)
+		self.completions[player.team].remove(member_id)
+
+		player.team = team
+		self.teams[team].add(member_id)
+		self.completions[team].add(player.name, member_id)
+
+	def rename(self, member_id:int, name:str):
+		"""Updates the name a player is autocompleted and recorded under, after a nickname change"""
+
+		player = self.players.get(member_id)
+		if player is None: return
+
+		player.name = name
+
+		if player.status == 'playing':
+			self.completions[player.team].remove(member_id)
+			self.completions[player.team].add(name, member_id)
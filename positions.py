@@ -0,0 +1,210 @@
+#positions.py
+
+# Live player positions, sent to a local UDP port as lines of 'member id,latitude,longitude' (several lines may share
+# a datagram). The trace tools generate and replay position traces, for testing without anyone going outside:
+#
+#     python positions.py trace --players 50 --seconds 600 --rate 2 > trace.csv
+#     python positions.py replay trace.csv --port 9465 --speed 10
+
+############ IMPORTS ############
+
+from geo import GridIndex
+from clock import clock
+import argparse, array, asyncio, math, random, socket, sys, time
+
+########## CLASSES ##########
+
+class PositionTable:
+	"""The latest position of each player, in parallel arrays indexed by row, with a spatial grid kept up to date
+
+	A player is stationary while every update stays within `still_km` of where they stopped, and is only reported as
+	stationary once per stop
+	"""
+
+	def __init__(self, still_km:float = 0.05, cell_km:float = 0.5):
+
+		self.still_km = still_km
+		self.rows = {} # Member id -> row
+		self.ids = [] # Row -> member id
+
+		self.latitude = array.array('d')
+		self.longitude = array.array('d')
+		self.updated = array.array('d') # Time of the latest update
+		self.still_since = array.array('d') # When they stopped moving
+		self.anchor_x = array.array('d') # Projected position (km) where they stopped moving
+		self.anchor_y = array.array('d')
+		self.reported = bytearray() # 1 once the current stop has been reported
+
+		self.grid = GridIndex(cell_km)
+		self.arrived = set() # Member ids of runners who have reached the end location
+
+	def __len__(self):
+		return len(self.ids)
+
+	def update(self, member_id:int, latitude:float, longitude:float, when:float):
+
+		x, y = self.grid.project(latitude, longitude)
+		row = self.rows.get(member_id)
+
+		if row is None:
+			self.rows[member_id] = row = len(self.ids)
+			self.ids.append(member_id)
+			for column in (self.latitude, self.longitude, self.updated, self.still_since, self.anchor_x, self.anchor_y): column.append(0.0)
+			self.reported.append(0)
+			self.still_since[row], self.anchor_x[row], self.anchor_y[row] = when, x, y
+
+		elif math.hypot(x - self.anchor_x[row], y - self.anchor_y[row]) > self.still_km: # They've moved, so this is where they might stop next
+			self.still_since[row], self.anchor_x[row], self.anchor_y[row] = when, x, y
+			self.reported[row] = 0
+
+		self.latitude[row], self.longitude[row], self.updated[row] = latitude, longitude, when
+		self.grid.add(member_id, latitude, longitude)
+
+	def position(self, member_id:int):
+		"""Returns a player's latest (latitude, longitude), or None"""
+
+		row = self.rows.get(member_id)
+		return None if row is None else (self.latitude[row], self.longitude[row])
+
+	def distance(self, member_id:int, latitude:float, longitude:float):
+		"""Returns how far a player is from a coordinate in km, or None if they haven't sent a position"""
+
+		if member_id not in self.grid.points: return None
+		return math.dist(self.grid.points[member_id], self.grid.project(latitude, longitude))
+
+	def near(self, latitude:float, longitude:float, km:float):
+		"""Returns the ids of the players within `km` of a coordinate"""
+
+		return self.grid.within(latitude, longitude, 0.0, km)
+
+	def stationary(self, now:float, seconds:float):
+		"""Returns (member id, seconds still) for players who have newly been still for at least `seconds`, and marks them reported"""
+
+		found = []
+
+		for row, member_id in enumerate(self.ids):
+			still = now - self.still_since[row]
+			if still >= seconds and not self.reported[row]:
+				self.reported[row] = 1
+				found.append((member_id, still))
+
+		return found
+
+class PositionProtocol(asyncio.DatagramProtocol):
+	"""Parses position datagrams and hands each update to `handle(member id, latitude, longitude, time)`
+
+	Parsing and handling an update is a few dictionary and array operations on the event loop, so hundreds of updates
+	a second don't hold up command handling
+	"""
+
+	def __init__(self, handle):
+
+		self.handle = handle
+		self.received = 0
+		self.rejected = 0
+
+	def datagram_received(self, data:bytes, address):
+
+		now = clock.time()
+
+		for line in data.decode(errors = "replace").splitlines():
+			try:
+				member_id, latitude, longitude = line.split(',')[:3]
+				member_id, latitude, longitude = int(member_id), float(latitude), float(longitude)
+
+			except ValueError:
+				self.rejected += 1
+				continue
+
+			self.received += 1
+			self.handle(member_id, latitude, longitude, now)
+
+########## FUNCTIONS ##########
+
+async def start_ingest(handle, port:int, host:str = "127.0.0.1"):
+	"""Listens for position datagrams on host:port, and returns the protocol (which counts what it has received)"""
+
+	_, protocol = await asyncio.get_running_loop().create_datagram_endpoint(lambda : PositionProtocol(handle), local_addr = (host, port))
+	return protocol
+
+def generate_trace(player_ids:list, seconds:float, rate:float, centre:tuple = (50.7236, -3.5275), seed:int = 0):
+	"""Yields (offset seconds, member id, latitude, longitude) for players walking at random around `centre`
+
+	Each player sends `rate` updates a second, and some of them stop for a few minutes at a time
+	"""
+
+	rng = random.Random(seed)
+	step = 1.4 / 111_000 # Degrees moved per second at walking pace
+	players = {member_id : [centre[0] + rng.uniform(-0.01, 0.01), centre[1] + rng.uniform(-0.015, 0.015), rng.uniform(0, math.tau), 0.0] for member_id in player_ids}
+
+	for tick in range(int(seconds * rate)):
+		offset = tick / rate
+
+		for member_id, player in players.items():
+			if player[3] <= offset and rng.random() < 0.002: player[3] = offset + rng.uniform(60, 600) # Stops for a while
+
+			if player[3] <= offset:
+				player[2] += rng.gauss(0, 0.3)
+				player[0] += math.sin(player[2]) * step / rate
+				player[1] += math.cos(player[2]) * step / rate
+
+			yield offset, member_id, player[0], player[1]
+
+def replay_trace(lines, port:int, speed:float = 1.0, host:str = "127.0.0.1"):
+	"""Sends a trace to the ingest port, keeping its timing (sped up by `speed`) and batching updates that share a time"""
+
+	sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	start = time.monotonic()
+	batch, batch_offset, sent = [], 0.0, 0
+
+	def send(batch:list):
+		for i in range(0, len(batch), 20): # Keeps each datagram well under a typical MTU
+			sender.sendto("\n".join(batch[i:i + 20]).encode(), (host, port))
+
+	for line in lines:
+		offset, member_id, latitude, longitude = line.strip().split(',')
+
+		if float(offset) != batch_offset and batch:
+			time.sleep(max(0.0, start + batch_offset / speed - time.monotonic()))
+			send(batch)
+			sent += len(batch)
+			batch = []
+
+		batch_offset = float(offset)
+		batch.append(f"{member_id},{latitude},{longitude}")
+
+	if batch:
+		send(batch)
+		sent += len(batch)
+
+	return sent
+
+########## TRACE TOOLS ##########
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description = "Generates or replays player position traces")
+	commands = parser.add_subparsers(dest = "command", required = True)
+
+	trace = commands.add_parser("trace", help = "Writes a random position trace to stdout")
+	trace.add_argument("--players", type = int, default = 50)
+	trace.add_argument("--seconds", type = float, default = 600)
+	trace.add_argument("--rate", type = float, default = 1.0, help = "Updates per player per second")
+	trace.add_argument("--seed", type = int, default = 0)
+	trace.add_argument("--ids", help = "Comma-separated member ids to use instead of 1..players")
+
+	replay = commands.add_parser("replay", help = "Sends a trace to the bot's position port")
+	replay.add_argument("file")
+	replay.add_argument("--port", type = int, default = 9465)
+	replay.add_argument("--speed", type = float, default = 1.0)
+
+	args = parser.parse_args()
+
+	if args.command == "trace":
+		player_ids = [int(member_id) for member_id in args.ids.split(',')] if args.ids else list(range(1, args.players + 1))
+		for offset, member_id, latitude, longitude in generate_trace(player_ids, args.seconds, args.rate, seed = args.seed):
+			sys.stdout.write(f"{offset:.3f},{member_id},{latitude:.6f},{longitude:.6f}\n")
+
+	else:
+		with open(args.file, "r") as trace_file:
+			print(f"Sent {replay_trace(trace_file, args.port, args.speed)} updates")
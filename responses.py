@@ -0,0 +1,81 @@
+#responses.py
+
+############ IMPORTS ############
+
+from outbox import MESSAGE_LIMIT
+import discord
+import functools, time
+
+########## FUNCTIONS ##########
+
+def paginate(lines, limit:int = MESSAGE_LIMIT):
+	"""Joins lines into pages of at most `limit` characters, without splitting a line (one longer than a page is cut short)"""
+
+	pages, page, length = [], [], 0
+
+	for line in lines:
+		line = line[:limit]
+
+		if page and length + 1 + len(line) > limit:
+			pages.append("\n".join(page))
+			page, length = [], 0
+
+		length += len(line) + (1 if page else 0)
+		page.append(line)
+
+	if page: pages.append("\n".join(page))
+	return pages
+
+async def reply(interaction:discord.Interaction, content:str):
+	"""Sends a command's ephemeral reply, as a follow-up if the interaction has already been acknowledged"""
+
+	if interaction.extras.get('expired'): return # Discord has already given up on this interaction
+
+	if interaction.response.is_done(): await interaction.followup.send(content, ephemeral = True)
+	else: await interaction.response.send_message(content, ephemeral = True)
+
+	interaction.extras['replied'] = True
+
+########## CLASSES ##########
+
+class ResponsePipeline:
+	"""Acknowledges every command the moment it arrives, then runs it and finishes with a follow-up
+
+	Discord gives up on an interaction that isn't acknowledged within 3 seconds, which is easy to miss when a command
+	edits roles or sends messages first. Deferring straight away means each interaction is acknowledged exactly once,
+	however long the command takes, and a command that finishes without replying still gets a follow-up
+	"""
+
+	def __init__(self, observe = None, done_message:str = "Done"):
+
+		self.observe = observe # Called with (command, seconds until acknowledged) for every command, if given
+		self.done_message = done_message
+
+	def deferred(self, func):
+		"""Decorates a command handler so it is deferred before it runs, and always replied to once it has"""
+
+		name = func.__name__.replace('_', '-')
+
+		@functools.wraps(func)
+		async def wrapper(interaction:discord.Interaction, *args, **kwargs):
+
+			start = time.perf_counter()
+
+			try: await interaction.response.defer(ephemeral = True, thinking = True)
+
+			except discord.HTTPException as e: # Usually the interaction expired before it reached us, but the command should still take effect
+				print(f"Could not acknowledge /{name} : {e}")
+				interaction.extras['expired'] = True
+
+			if self.observe: self.observe(name, time.perf_counter() - start)
+
+			try: result = await func(interaction, *args, **kwargs)
+
+			except Exception as e:
+				if not interaction.extras.get('replied'): await reply(interaction, f"Something went wrong : **{e}**")
+				raise
+
+			if not interaction.extras.get('replied'): await reply(interaction, self.done_message)
+			return result
+
+		return wrapper
@@ -0,0 +1,46 @@
+#roles.py
+
+############ IMPORTS ############
+
+import discord
+import asyncio
+from clock import clock
+
+########## FUNCTIONS ##########
+
+async def bulk_edit_roles(members:dict, role:discord.Role, add:bool = True, limit:int = 5, retries:int = 3):
+	"""Adds or removes a role for many members concurrently, given as member id -> member. Returns the ids of the members
+	that could not be updated, including any whose member is None because they couldn't be found
+
+	At most `limit` requests are in flight at once. They all share the guild's member-role rate limit bucket, which
+	discord.py already queues on, so anything past that only lengthens the queue. A 429 that still gets through is
+	retried after the delay Discord asks for, up to `retries` times
+	"""
+
+	semaphore = asyncio.Semaphore(limit)
+
+	async def edit(member):
+
+		if member is None: return False
+
+		async with semaphore:
+			for attempt in range(retries + 1):
+
+				try:
+					if add: await member.add_roles(role)
+					else: await member.remove_roles(role)
+					return True
+
+				except discord.RateLimited as e: delay = e.retry_after
+
+				except discord.HTTPException as e:
+					if e.status != 429: return False
+					delay = 2 ** attempt
+
+				if attempt < retries: await clock.sleep(delay)
+
+			return False
+
+	results = await asyncio.gather(*(edit(member) for member in members.values()))
+
+	return [member_id for member_id, updated in zip(members, results) if not updated]
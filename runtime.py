@@ -0,0 +1,41 @@
+#runtime.py
+
+# The bot's long-lived state : the client, every game and the caches and queues around them. It is imported once and
+# never reloaded, so /reload can swap the code in gameplay.py and the command extensions while games, timers and
+# rosters carry on
+
+############ IMPORTS ############
+
+import time
+process_start = time.perf_counter() # Taken before the other imports (bot.py imports this first), so startup time includes them
+
+from discord.ext import commands
+from games import Game, GameRegistry
+from locations import LocationIndex
+from metrics import Metrics
+from responses import ResponsePipeline
+from permissions import RoleCache
+from archive import Archive
+from analytics import Analytics
+from gateway import client_options
+import os, atexit, collections
+
+########## CONSTANTS ##########
+
+lean = bool(os.environ.get("MANHUNT_LEAN")) # Minimal intents and caches, fetching players' members when a game needs them
+bot_class = commands.AutoShardedBot if os.environ.get("MANHUNT_SHARDED") else commands.Bot # Sharding is only needed for large deployments
+bot = bot_class(command_prefix='/', **client_options(lean))
+
+games = GameRegistry() # One game per configured bot channel, see 'channels.json'
+member_indexes = {} # guild id -> MemberIndex
+outboxes = {} # channel id -> Outbox
+recent_ends = collections.defaultdict(lambda : collections.deque(maxlen = 5)) # guild id -> its latest end locations
+location_index = LocationIndex("locations.txt")
+role_cache = RoleCache((Game.RUNNER_ROLE, Game.HUNTER_ROLE, Game.ADMIN_ROLE)) # Game role ids by guild, kept up to date by the role events
+archive = Archive("logs") # Compressed logs of every finished game, with a manifest to list them by
+analytics = Analytics(archive) # Statistics over the archive, updated as games are added to it
+atexit.register(games.flush_now) # Nothing queued is lost on a clean shutdown
+
+metrics = Metrics(process_start)
+metrics.watch_logs(lambda : [writer for game in games for writer in (game.log.events, game.log.text)])
+responses = ResponsePipeline(observe = metrics.observe_ack) # Every command is deferred straight away, then replied to with a follow-up
@@ -0,0 +1,112 @@
+#scheduler.py
+
+############ IMPORTS ############
+
+from clock import clock
+import asyncio
+
+########## CLASSES ##########
+
+class PhaseScheduler:
+	"""Keeps a monotonic deadline for the end of each game phase and sleeps until the next one is due"""
+
+	PHASES = ('headstart', 'gametime', 'endtime')
+
+	def __init__(self, headstart:float, gametime:float, endtime:float):
+
+		self.start = clock.monotonic()
+		self.wall_start = clock.time() # Monotonic time doesn't survive a restart, so snapshots use this instead
+		self.durations = {'headstart' : headstart, 'gametime' : gametime, 'endtime' : endtime}
+		self.fired = set()
+		self.latency = {}
+
+		self._woken = False
+		self._changed = asyncio.Event()
+
+	def snapshot(self):
+		return {'wall_start' : self.wall_start, 'durations' : self.durations, 'fired' : sorted(self.fired)}
+
+	@classmethod
+	def restore(cls, state:dict):
+		"""Rebuilds a scheduler from a snapshot. Any phase that ended while the bot was down is due immediately"""
+
+		scheduler = cls(**state['durations'])
+		scheduler.wall_start = state['wall_start']
+		scheduler.start = clock.monotonic() - (clock.time() - state['wall_start'])
+		scheduler.fired = set(state['fired'])
+
+		return scheduler
+
+	def deadline(self, phase:str):
+		"""Returns the monotonic time at which the given phase ends"""
+
+		total = self.start
+		for name in self.PHASES:
+			total += self.durations[name]
+			if name == phase: return total
+
+		raise ValueError(f"Unknown phase {phase}")
+
+	def next_transition(self):
+		"""Returns (phase, seconds until it ends) for the next pending phase, or None once every phase has ended"""
+
+		for phase in self.PHASES:
+			if phase not in self.fired:
+				return phase, self.deadline(phase) - clock.monotonic()
+
+		return None
+
+	def remaining(self, phase:str):
+		"""Returns how many seconds are left before the given phase ends"""
+
+		return self.deadline(phase) - clock.monotonic()
+
+	def extend(self, phase:str, seconds:float):
+		"""Pushes back the end of a phase that has not yet ended. Returns False if the phase is already over"""
+
+		if phase in self.fired: return False
+
+		self.durations[phase] += seconds
+		self._changed.set()
+		return True
+
+	def shorten(self, phase:str, seconds:float):
+		"""Brings forward the end of a phase, as long as the new deadline is still in the future"""
+
+		if phase in self.fired or seconds >= self.durations[phase] or self.remaining(phase) - seconds <= 0: return False
+
+		self.durations[phase] -= seconds
+		self._changed.set()
+		return True
+
+	def wake(self):
+		"""Wakes up the waiting task early, so it can re-check the game state"""
+
+		self._woken = True
+		self._changed.set()
+
+	async def wait(self):
+		"""Sleeps until the next phase ends and returns its name, or returns None if woken early by wake()"""
+
+		while True:
+			self._changed.clear()
+
+			if self._woken:
+				self._woken = False
+				return None
+
+			upcoming = self.next_transition()
+
+			if upcoming is None:
+				await self._changed.wait()
+				continue
+
+			phase, delay = upcoming
+
+			if delay > 0:
+				if await clock.wait_event(self._changed, delay): continue # A deadline was rescheduled, or wake() was called
+				if self.remaining(phase) > 0: continue # Woken fractionally early by the event loop
+
+			self.fired.add(phase)
+			self.latency[phase] = -self.remaining(phase)
+			return phase
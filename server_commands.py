@@ -0,0 +1,106 @@
+#server_commands.py
+
+# The commands for setting up channels, statistics and help. A command extension, so /reload can swap it in place
+
+############ IMPORTS ############
+
+import discord
+from discord import app_commands
+from runtime import games, analytics, role_cache, metrics, responses
+from gameplay import stats_player_autocomplete
+from games import Game
+from responses import reply
+
+########## COMMANDS ##########
+
+@app_commands.command(name = "setup-channels", description = "Sets up this channel to run its own games of Manhunt")
+@app_commands.describe(hunter_channel = "The channel for messages only the hunters should see", log_channel = "The channel that game logs are uploaded to")
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.ADMIN_ROLE)
+async def setup_channels(interaction: discord.Interaction, hunter_channel: discord.TextChannel, log_channel: discord.TextChannel):
+
+	game = games.games.get((interaction.guild_id, interaction.channel_id)) # Only this channel's own game, not the guild's only one as find() falls back to
+
+	if game and game.game_running: await reply(interaction, "The channels cannot be changed while a game is running")
+
+	else:
+		games.configure(interaction.channel, hunter_channel, log_channel)
+		await reply(interaction, f"This channel now runs Manhunt games, with hunters in {hunter_channel.mention} and logs in {log_channel.mention}")
+
+@app_commands.command(name = "stats", description = "Shows statistics from every finished game, or for one player")
+@app_commands.describe(player = "The player to show statistics for")
+@app_commands.autocomplete(player = stats_player_autocomplete)
+@metrics.timed
+@responses.deferred
+async def stats(interaction: discord.Interaction, player: str = None):
+
+	message = analytics.player_summary(player) if player else analytics.summary()
+	await reply(interaction, message[:2000])
+
+@app_commands.command(name = "bot-stats", description = "Shows how quickly each command is handled, and how many calls it makes to Discord")
+@metrics.timed
+@responses.deferred
+@role_cache.requires(Game.ADMIN_ROLE)
+async def bot_stats(interaction: discord.Interaction):
+	await reply(interaction, metrics.summary()[:2000])
+
+@app_commands.command(name = "bot-credits", description = "Lists the credits for the bot")
+@metrics.timed
+@responses.deferred
+async def bot_credits(interaction: discord.Interaction):
+
+	await reply(interaction, "This bot was coded by Alex T-J (EMS 2023)")
+
+@app_commands.command(name = "manhunt-help", description = "Explains all of the Manhunt bot commands")
+@metrics.timed
+@responses.deferred
+async def manhunt_help(interaction: discord.Interaction):
+
+	help_message = (
+
+		"\n/suggest-game  : Suggests a game of Manhunt, people react to join\n"
+		"/unsuggest : Deletes any outstanding game suggestions\n"
+		"/lobby : Lists everyone who has joined the current suggestion\n"
+		"/start-game <headstart> <runtime> <endtime> <start> <min-distance> <max-distance> : Starts the current suggestion as a game, optionally with an end location a set distance from the start\n"
+		"/end-game : Ends the current game, regardless of the game state\n\n"
+
+		"/locations <page> : Lists all the possible end locations, a page at a time\n"
+		"/add-location <location> <latitude> <longitude> : Adds a location to the possible end location list\n"
+		"/del-location <location> : Deletes a location from the possible end location list\n"
+		"/import-locations <file> : Adds every location in a text file to the possible end location list\n\n"
+
+		"/catch <runner> : A hunter has caught a specific runner\n"
+		"/resign : A player resigns\n"
+		"/disqualify <player> : A player is disqualified\n"
+		"/win : A runner has made it to the end location successfully\n\n"
+
+		"/extend <phase> <time> : Extends a given phase by a given number of minutes\n"
+		"/shorten <phase> <time> : Shortens a given phase by a given number of minutes\n"
+		"/set-location <location> : Changes the end location for a game\n\n"
+
+		"/add-player <discord-name> : Adds a player to the game as a runner, after it has started\n"
+		"/add-hunter <name | random> : Makes a random / chosen player a hunter\n\n"
+
+		"/players-list : Lists the players in the current game, and their current status\n"
+		"/comment : Add an observation to the game log of a current game\n"
+		"/random-runner : Picks a random runner\n"
+		"/stats <player> : Statistics from every finished game, or for one player\n\n"
+
+		"/setup-channels <hunter-channel> <log-channel> : Sets up the current channel to run its own games\n\n"
+
+		"/bot-stats : Command latency and Discord API usage, for admins\n"
+		"/reload : Swaps in changes to the commands without restarting the bot or interrupting games, for admins\n"
+		"/bot-credits : Credits for the bot\n"
+		)
+	
+	await reply(interaction, help_message)
+
+########## EXTENSION ##########
+
+COMMANDS = (setup_channels, stats, bot_stats, bot_credits, manhunt_help)
+
+async def setup(bot):
+	"""Adds this extension's commands to the tree. Unloading the extension takes them out again"""
+
+	for command in COMMANDS: bot.tree.add_command(command)
@@ -0,0 +1,488 @@
+#simulate.py
+
+# Plays whole games of Manhunt against the fake guild on a virtual clock, so a 90 minute game takes a fraction of a
+# second, and checks that every game keeps to the rules below. Exits with status 1 if any game breaks one:
+#
+#     python simulate.py --games 1000 --players 20 --seed 1
+#
+# 1. No player is ever on both teams
+# 2. Each phase is announced at most once and in order, and all three are announced if the game runs out of time
+# 3. Each game's log is numbered without gaps, and ends with exactly one 'end' event
+# 4. Once a game is over, nobody in the guild still has the runner or hunter role
+# 5. Every command is acknowledged exactly once, and the user gets a reply
+# 6. Every event in the log makes sense at the point it was written: only runners are caught, nobody leaves twice, and
+#    nobody joins while they are still playing
+# 7. Reloading the commands with /reload mid-game swaps in new handlers, and leaves the game, its timers and its
+#    roster exactly as they were. After reloading twice, a reaction dispatched as Discord would is handled exactly once
+# 8. /setup-channels in another channel sets up a second game while the guild's first game is running
+# 9. The statistics count every game each member played once, under their member id, even though members change
+#    their display names between games and mid-game
+#
+# Before any of that, it checks that the bot can shut down : an event loop left with an outbox and a log writer woken
+# mid-batch must still exit once asyncio.run has cancelled their background tasks. It also edits the roles of a guild
+# whose role routes answer some calls with a 429, and checks that every edit is retried on the clock or reported.
+#
+# The stress scenario fires hundreds of conflicting commands at a game at once, with a delay on every Discord call so
+# they interleave, then also checks that everyone's roles match their team:
+#
+#     python simulate.py --stress 500 --players 100 --latency 0.01
+
+############ IMPORTS ############
+
+from fakediscord import ApiCounter, FakeChannel, FakeGuild, FakeInteraction, FakeReactionPayload
+from loadtest import load_bot
+from clock import clock, VirtualClock
+from events import GameState, iter_events, player_key
+from outbox import Outbox, HIGH
+from gamelog import LogWriter
+from games import GameRegistry
+from roles import bulk_edit_roles
+import argparse, asyncio, collections, copy, json, os, random, sys, tempfile, threading, time
+
+########## CONSTANTS ##########
+
+ACTIONS = ('catch', 'resign', 'extend', 'shorten', 'win', 'add-player', 'add-hunter', 'end-game', 'reload', 'rename')
+WEIGHTS = (8, 2, 2, 2, 3, 1, 1, 0.2, 0.5, 1)
+
+########## FUNCTIONS ##########
+
+def random_script(rng:random.Random, times:tuple):
+	"""Returns a randomized script for a game with the given phase lengths, as a sorted list of (virtual seconds, action)
+
+	Scripts can also be written by hand. Who does what is decided when each action runs, from whoever is playing then
+	"""
+
+	length = sum(times) * 60
+	return sorted((rng.uniform(0, length), rng.choices(ACTIONS, WEIGHTS)[0]) for _ in range(rng.randint(5, 30)))
+
+async def leave_mid_batch(folder:str):
+	"""Wakes an outbox and a log writer in the middle of a batch and returns straight away, as a shutdown might"""
+
+	outbox = Outbox(FakeGuild(1, ApiCounter()).bot_channel)
+	writer = LogWriter(os.path.join(folder, "shutdown.txt"))
+
+	outbox.post("A line that waits for others to merge with")
+	writer.write("A line that waits for the batch to fill\n")
+	await asyncio.sleep(0)
+
+	outbox.post("An announcement", priority = HIGH)
+	for i in range(writer.max_batch): writer.write(f"Line {i}\n")
+
+def check_shutdown(timeout:float = 5.0):
+	"""Returns whether asyncio.run exits within `timeout` seconds of leave_mid_batch() returning, once it has cancelled
+	the background tasks. Runs in real time, on its own thread, so a hang can't stop the simulator
+	"""
+
+	with tempfile.TemporaryDirectory() as folder:
+		thread = threading.Thread(target = asyncio.run, args = (leave_mid_batch(folder),), daemon = True)
+		thread.start()
+		thread.join(timeout)
+
+	return not thread.is_alive()
+
+async def check_bulk_roles(virtual_clock:VirtualClock, member_count:int = 200, rate_limit:float = 0.3):
+	"""Gives a role to a guild's members, plus one who can't be found, while `rate_limit` of the role edits are refused
+	with a 429. Returns (the calls refused, virtual seconds taken, a list of anything that went wrong)
+	"""
+
+	api = ApiCounter(rate_limit = rate_limit)
+	guild = FakeGuild(member_count, api)
+	role = guild.role('Runner')
+
+	members = {member.id : member for member in guild.members}
+	members[0] = None # Not in the guild
+	start = virtual_clock.elapsed
+
+	task = asyncio.create_task(bulk_edit_roles(members, role))
+	await virtual_clock.run_until(task.done, limit = 60 * 60)
+	failed = set(task.result())
+
+	problems = []
+	if 0 not in failed: problems.append("a member who couldn't be found wasn't reported")
+
+	wrong = [member.display_name for member in guild.members if (role in member.roles) == (member.id in failed)]
+	if wrong: problems.append(f"role edits were reported wrongly for {len(wrong)} members, such as {wrong[:5]}")
+	if not api.rate_limited: problems.append("no role edit was rate limited")
+
+	return sum(api.rate_limited.values()), virtual_clock.elapsed - start, problems
+
+class Simulation:
+	"""Runs games one after another in a single fake guild, collecting any broken rules in `violations`"""
+
+	def __init__(self, bot_module, virtual_clock:VirtualClock, player_count:int, seed:int, latency:float = 0.0):
+
+		self.bot = bot_module
+		self.clock = virtual_clock
+		self.rng = random.Random(seed)
+		self.player_count = player_count
+
+		self.guild = FakeGuild(player_count * 2 + 1, ApiCounter(latency))
+		self.admin = self.guild.members[0]
+		self.admin.roles.append(self.guild.role('Admin'))
+
+		self.game = bot_module.games.configure(self.guild.bot_channel, self.guild.hunter_channel, self.guild.log_channel)
+		self.violations = []
+		self.games = 0
+		self.played = collections.Counter() # Member id -> games played, as the statistics should count them
+
+	def member(self, user_id:int):
+		return self.bot.member_index(self.guild).get(user_id)
+
+	def fail(self, rule:str):
+		self.violations.append(f"game {self.games} at {self.clock.elapsed:.0f}s : {rule}")
+
+	async def invoke(self, name:str, user, **arguments):
+
+		interaction = FakeInteraction(user, self.guild.bot_channel)
+		await self.bot.bot.tree.get_command(name).callback(interaction, **arguments)
+
+		if interaction.response.acks != 1 or not interaction.response.messages: self.fail(f"/{name} was acknowledged {interaction.response.acks} times with {len(interaction.response.messages)} replies")
+
+	def check_teams(self):
+
+		players = self.game.players
+		both = players.teams['runners'] & players.teams['hunters']
+		if both: self.fail(f"players on both teams : {sorted(both)}")
+
+	async def act(self, action:str):
+		"""Performs one scripted action, picking who does it from the players still in the game"""
+
+		game, rng = self.game, self.rng
+		runners, hunters = game.players.ids('runners'), game.players.ids('hunters')
+
+		if action == 'catch' and runners and hunters:
+			await self.invoke('catch', self.member(rng.choice(hunters)), runner = str(rng.choice(runners)))
+
+		elif action == 'resign' and runners + hunters:
+			await self.invoke('resign', self.member(rng.choice(runners + hunters)))
+
+		elif action in ('extend', 'shorten'):
+			await self.invoke(action, self.admin, phase = rng.choice(('headstart', 'gametime', 'endtime')), time = rng.randint(1, 10))
+
+		elif action == 'win' and runners:
+			await self.invoke('win', self.member(rng.choice(runners)))
+
+		elif action == 'add-player':
+			outsiders = [member for member in self.guild.members[1:] if game.players.get(member.id) is None]
+			if outsiders: await self.invoke('add-player', rng.choice(outsiders))
+
+		elif action == 'add-hunter' and runners:
+			await self.invoke('add-hunter', self.member(rng.choice(runners)))
+
+		elif action == 'rename' and runners + hunters: # A nickname change mid-game, which the log must still follow
+			member = self.member(rng.choice(runners + hunters))
+			before = copy.copy(member)
+			member.display_name = f"{member.name} ({rng.randint(1, 999)})"
+			await self.bot.on_member_update(before, member)
+
+		elif action == 'end-game':
+			await self.invoke('end-game', self.admin)
+
+		elif action == 'reload':
+			await self.reload()
+
+	async def reload(self):
+		"""Reloads the commands mid-game with /reload, and checks that the game carried on exactly as it was"""
+
+		game, tree = self.game, self.bot.bot.tree
+		before = (game.snapshot(), game.players, game.scheduler, game.phase_task)
+		handler = tree.get_command('catch').callback
+
+		await self.invoke('reload', self.admin)
+
+		if self.bot.games.find(self.guild.id, self.guild.bot_channel.id) is not game: self.fail("/reload replaced the game")
+		if (game.snapshot(), game.players, game.scheduler, game.phase_task) != before: self.fail("/reload changed the game's state")
+		if game.phase_task.done(): self.fail("the phase task stopped on /reload")
+		if tree.get_command('catch').callback is handler: self.fail("/reload didn't swap in new command handlers")
+
+	async def check_reaction_after_reloads(self, suggestion, member):
+		"""Reloads the commands twice while a suggestion is open, then has a member react to it through bot.dispatch(), as
+		Discord's gateway would. Handlers left behind by either reload would join the lobby a second time"""
+
+		games, bot = self.bot.games, self.bot.bot
+		saves = []
+		save = games.save
+		games.save = lambda game : (saves.append(game), save(game)) # Each reaction that joins the lobby saves the game once
+
+		try:
+			for _ in range(2): await self.invoke('reload', self.admin)
+
+			bot.dispatch('raw_reaction_add', FakeReactionPayload(suggestion, member, self.game.RUNNER_REACTION))
+			await self.clock.settle()
+
+		finally: del games.save
+
+		if bot.on_raw_reaction_add is not self.bot.on_raw_reaction_add: self.fail("the reaction handler wasn't swapped on /reload")
+		if len(saves) != 1: self.fail(f"a reaction after two reloads was handled {len(saves)} times")
+		if member.id not in self.game.lobby['runners']: self.fail("a reaction after two reloads didn't join the lobby")
+
+	async def restore(self, count:int):
+		"""Saves `count` copies of a running game's snapshot under new channels, then restores them all into a fresh
+		registry as a restart would. Checks each comes back as it was saved, and returns the seconds the restore took
+		"""
+
+		game = self.game
+		if not await self.start((5, 70, 15)): return None
+
+		state = json.loads(json.dumps(game.snapshot())) # As it comes back out of the store
+		await self.invoke('end-game', self.admin)
+		await self.clock.run_until(lambda : game.start_time is None)
+
+		paths = ("restart.json", "restart", "restart.db")
+		saved, channels = GameRegistry(*paths), {}
+
+		for _ in range(count):
+			guild = FakeGuild(0, self.guild.api)
+			saved.configure(guild.bot_channel, guild.hunter_channel, guild.log_channel)
+			saved.store.save(guild.id, guild.bot_channel.id, state)
+			channels.update((channel.id, channel) for channel in (guild.bot_channel, guild.hunter_channel, guild.log_channel))
+
+		saved.store.close()
+		restarted = GameRegistry(*paths)
+
+		start = time.perf_counter()
+		restarted.bind(channels.get)
+		seconds = time.perf_counter() - start
+
+		changed = [restored for restored in restarted if json.loads(json.dumps(restored.snapshot())) != state]
+		if len(restarted) != count or changed: self.fail(f"{len(restarted)} of {count} saved games were restored, {len(changed)} of them differently")
+
+		restarted.store.close()
+		return seconds
+
+	async def run_script(self, script:list):
+
+		for at, action in script:
+			await clock.sleep(at - self.clock.elapsed + self.started)
+			if not self.game.game_running: return
+
+			await self.act(action)
+			self.check_teams()
+
+	async def start(self, times:tuple):
+		"""Suggests a game, fills its lobby with a random sample of the guild and starts it. Returns False if it didn't start"""
+
+		self.games += 1
+		game, rng = self.game, self.rng
+
+		if rng.random() < 0.2: # Someone changes their display name, which mustn't split their statistics
+			member = rng.choice(self.guild.members[1:])
+			member.display_name = f"{member.name} {self.games}"
+			self.bot.member_index(self.guild).add(member)
+
+		await self.invoke('suggest-game', self.admin)
+		suggestion = self.guild.bot_channel.messages[game.suggestion_id]
+
+		players = rng.sample(self.guild.members[1:], self.player_count)
+		if self.games == 1: await self.check_reaction_after_reloads(suggestion, players[-1])
+
+		hunters = max(1, len(players) // 4)
+		for i, member in enumerate(players):
+			await self.bot.on_raw_reaction_add(FakeReactionPayload(suggestion, member, game.HUNTER_REACTION if i < hunters else game.RUNNER_REACTION))
+
+		await self.invoke('start-game', self.admin, headstart = times[0], gametime = times[1], endtime = times[2])
+		if not game.game_running:
+			self.fail("the game did not start")
+			return False
+
+		self.started = self.clock.elapsed
+		self.check_teams()
+		if self.games == 1: await self.check_second_game()
+		return True
+
+	async def check_second_game(self):
+		"""Runs /setup-channels in a new channel of the guild while its game is running, which should set up a second game"""
+
+		channels = [FakeChannel(self.guild, name) for name in ("manhunt-2", "hunters-2", "logs-2")]
+
+		interaction = FakeInteraction(self.admin, channels[0])
+		await self.bot.bot.tree.get_command('setup-channels').callback(interaction, hunter_channel = channels[1], log_channel = channels[2])
+
+		if (self.guild.id, channels[0].id) not in self.bot.games.games: self.fail(f"/setup-channels was refused in a second channel : {interaction.response.messages}")
+		if not self.game.game_running: self.fail("setting up a second channel stopped the running game")
+
+	async def play(self, script:list = None, times:tuple = (5, 70, 15)):
+		"""Plays one game from suggestion to teardown, then checks it kept to the rules"""
+
+		game, rng = self.game, self.rng
+		if not await self.start(times): return
+
+		task = asyncio.create_task(self.run_script(random_script(rng, times) if script is None else script))
+		await self.clock.run_until(lambda : game.start_time is None and task.done(), limit = 24 * 60 * 60)
+		await self.clock.run_until(lambda : not any(len(outbox) or outbox.sending for outbox in self.bot.outboxes.values()))
+
+		self.check_log()
+		self.check_roles()
+
+	def check_log(self):
+
+		entry = list(self.bot.archive.entries())[-1]
+		events = list(iter_events(self.bot.archive.path(entry, 'events')))
+
+		if [event['seq'] for event in events] != list(range(1, len(events) + 1)): self.fail("the log's sequence numbers have gaps")
+		if [event['type'] for event in events].count('end') != 1 or events[-1]['type'] != 'end': self.fail("the log doesn't end with exactly one 'end' event")
+
+		state = GameState()
+		players = set()
+		for event in events:
+			self.check_event(state, event)
+			state.apply(event)
+
+			if event['type'] == 'start': players.update(event['runner_ids'], event['hunter_ids'])
+			elif event['type'] == 'join': players.add(event['player_id'])
+
+		self.played.update(str(player) for player in players)
+
+		phases = state.phases_ended
+		if phases != ['headstart', 'gametime', 'endtime'][:len(phases)]: self.fail(f"phases announced out of order or twice : {phases}")
+		if state.outcome != 'NO WIN' and state.runners and 'endtime' not in phases: self.fail("the game ended early with runners still playing")
+
+	def check_event(self, state:GameState, event:dict):
+
+		kind, playing = event['type'], state.runners | state.hunters
+		field = 'runner' if kind == 'catch' else 'player'
+		player = player_key(event, field) if field in event else None # Keyed by member id, as the state is
+
+		if kind == 'catch' and player not in state.runners: self.fail(f"{event['runner']} was caught while not a runner (event {event['seq']})")
+		elif kind == 'switch' and player not in state.runners: self.fail(f"{event['player']} switched to hunter while not a runner (event {event['seq']})")
+		elif kind in ('resign', 'disqualify', 'win') and player not in playing: self.fail(f"{event['player']} left ({kind}) while not playing (event {event['seq']})")
+		elif kind == 'join' and player in playing: self.fail(f"{event['player']} joined while already playing (event {event['seq']})")
+
+	def check_role_sync(self):
+		"""Checks that everyone has the role of the team they are on, and no other game role"""
+
+		runner_role, hunter_role = (self.game.RUNNER_ROLE, self.game.HUNTER_ROLE)
+		wrong = []
+
+		for member in self.guild.members:
+			names = {role.name for role in member.roles}
+			team = self.game.players.team_of(member.id)
+			if (runner_role in names) != (team == 'runners') or (hunter_role in names) != (team == 'hunters'): wrong.append(member.display_name)
+
+		if wrong: self.fail(f"roles don't match teams : {wrong[:5]}")
+
+	async def stress(self, count:int):
+		"""Starts a game and fires `count` conflicting commands at it at once, then does it again with an /end-game in the
+		middle. Returns the number of commands handled per second
+		"""
+
+		game, rng = self.game, self.rng
+		if not await self.start((5, 70, 15)): return 0.0
+
+		def burst(count:int):
+
+			runners, hunters = game.players.ids('runners'), game.players.ids('hunters')
+			targets = runners[:max(1, len(runners) // 10)] # Most commands fight over the same few runners
+			outsiders = [member for member in self.guild.members[1:] if game.players.get(member.id) is None][:20]
+			commands = []
+
+			for _ in range(count):
+				action = rng.choice(('catch', 'catch', 'catch', 'resign', 'add-hunter', 'add-player', 'disqualify', 'extend'))
+
+				if action == 'catch' and hunters: commands.append(self.invoke('catch', self.member(rng.choice(hunters)), runner = str(rng.choice(targets))))
+				elif action in ('resign', 'add-hunter'): commands.append(self.invoke(action, self.member(rng.choice(targets + hunters[:5]))))
+				elif action == 'add-player' and outsiders: commands.append(self.invoke('add-player', rng.choice(outsiders)))
+				elif action == 'disqualify': commands.append(self.invoke('disqualify', self.admin, player = str(rng.choice(targets)), reason = "stress"))
+				elif action == 'extend': commands.append(self.invoke('extend', self.admin, phase = 'endtime', time = 1))
+
+			return commands
+
+		first, second = burst(count), burst(count)
+		second.insert(len(second) // 2, self.invoke('end-game', self.admin))
+
+		start = time.perf_counter()
+		await asyncio.gather(*first)
+		elapsed = time.perf_counter() - start
+
+		await game.settle()
+		self.check_teams()
+		self.check_role_sync()
+
+		start = time.perf_counter()
+		await asyncio.gather(*second)
+		elapsed += time.perf_counter() - start
+
+		await asyncio.gather(*(outbox.drain() for outbox in self.bot.outboxes.values()))
+
+		if game.game_running: self.fail("the game was still running after /end-game")
+		else:
+			self.check_log()
+			self.check_roles()
+
+		return (len(first) + len(second)) / elapsed
+
+	async def check_stats(self):
+
+		analytics = self.bot.analytics
+		await analytics.update()
+
+		counted = {key : analytics.players['games'][row] for key, row in analytics.player_rows.items()}
+		if counted != dict(self.played):
+			wrong = [analytics.player_names.get(key, key) for key in counted.keys() | self.played.keys() if counted.get(key) != self.played.get(key)]
+			self.fail(f"the statistics miscount the games of {len(wrong)} players, such as {wrong[:5]}")
+
+	def check_roles(self):
+
+		role_names = (self.game.RUNNER_ROLE, self.game.HUNTER_ROLE)
+		left = [member.display_name for member in self.guild.members if any(role.name in role_names for role in member.roles)]
+		if left: self.fail(f"players still have game roles after teardown : {left[:5]}")
+
+async def main(game_count:int, player_count:int, seed:int, stress:int = 0, latency:float = 0.0, restore:int = 0):
+
+	virtual_clock = VirtualClock()
+	if not stress: clock.use(virtual_clock) # The stress test runs in real time, as its commands wait on Discord rather than the clock
+
+	with tempfile.TemporaryDirectory() as folder:
+		bot_module = await load_bot(folder)
+		simulation = Simulation(bot_module, virtual_clock, player_count, seed, latency)
+
+		if stress:
+			rate = await simulation.stress(stress)
+			bot_module.games.store.close()
+
+			print(f"Handled {stress * 2 + 1} conflicting commands at {rate:,.0f} commands/s")
+			for violation in simulation.violations[:50]: print(violation)
+			print(f"{len(simulation.violations)} rules broken")
+
+			return not simulation.violations
+
+		rate_limited, backoff, problems = await check_bulk_roles(virtual_clock)
+		simulation.violations.extend(f"bulk role edits : {problem}" for problem in problems)
+
+		start = time.perf_counter()
+		for _ in range(game_count): await simulation.play()
+		real = time.perf_counter() - start
+		await simulation.check_stats()
+
+		restore_seconds = await simulation.restore(restore) if restore else None
+
+		reloads = bot_module.metrics.latency.get('reload_code')
+		bot_module.games.store.close()
+
+	print(f"Refused {rate_limited} role edits with a 429, backing off for {backoff:.1f} virtual seconds in all")
+	print(f"Played {simulation.games} games, {virtual_clock.elapsed / 3600:.1f} virtual hours in {real:.1f}s ({virtual_clock.elapsed / real:,.0f}x real time)")
+	if restore_seconds is not None: print(f"Restored {restore} saved games in {restore_seconds * 1000:.1f} ms ({restore_seconds / restore * 1e6:.0f} µs each)")
+	if reloads: print(f"Reloaded the commands {reloads.count} times, {reloads.sum / reloads.count * 1000:.1f} ms on average, {reloads.max * 1000:.1f} ms at most")
+	for violation in simulation.violations[:50]: print(violation)
+	print(f"{len(simulation.violations)} rules broken")
+
+	return not simulation.violations
+
+########## MAIN ##########
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description = "Plays accelerated games of Manhunt on a virtual clock and checks their invariants")
+	parser.add_argument("--games", type = int, default = 100)
+	parser.add_argument("--players", type = int, default = 20)
+	parser.add_argument("--seed", type = int, default = 0)
+	parser.add_argument("--stress", type = int, default = 0, help = "Instead of playing games, fire this many conflicting commands at once, twice")
+	parser.add_argument("--latency", type = float, default = 0.0, help = "Seconds added to every simulated Discord call")
+	parser.add_argument("--restore", type = int, default = 0, help = "After the games, restore this many saved running games as a restart would, and time it")
+	args = parser.parse_args()
+
+	if not check_shutdown():
+		print("The event loop didn't exit after shutdown cancelled an outbox and a log writer mid-batch")
+		sys.exit(1)
+
+	sys.exit(0 if asyncio.run(main(args.games, args.players, args.seed, args.stress, args.latency, args.restore)) else 1)
@@ -0,0 +1,36 @@
+#store.py
+
+############ IMPORTS ############
+
+import json, sqlite3
+
+########## CLASSES ##########
+
+class GameStore:
+	"""Persists a snapshot of each game's state to SQLite, so in-flight games survive a restart
+
+	The database runs in WAL mode with synchronous=NORMAL, so a save is an append to the write-ahead log rather than a
+	rewrite and fsync of the whole file, and a crash loses at most the last few saves rather than corrupting anything
+	"""
+
+	def __init__(self, path:str = "manhunt.db"):
+
+		self.connection = sqlite3.connect(path)
+		self.connection.execute("PRAGMA journal_mode = WAL")
+		self.connection.execute("PRAGMA synchronous = NORMAL")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS games (channel_id INTEGER PRIMARY KEY, guild_id INTEGER, state TEXT)")
+		self.connection.commit()
+
+	def save(self, guild_id:int, channel_id:int, state:dict):
+
+		with self.connection:
+			self.connection.execute("INSERT OR REPLACE INTO games VALUES (?, ?, ?)", (channel_id, guild_id, json.dumps(state)))
+
+	def load(self, channel_id:int):
+		"""Returns the saved state of the game run from a channel, or None"""
+
+		row = self.connection.execute("SELECT state FROM games WHERE channel_id = ?", (channel_id,)).fetchone()
+		return json.loads(row[0]) if row else None
+
+	def close(self):
+		self.connection.close()